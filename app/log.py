@@ -0,0 +1,150 @@
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from starlette.routing import Mount
+
+from app import metrics
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "json" for one JSON object per line, "text" for a readable line when running locally
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+# Fraction of requests whose info/debug logs are kept, warnings and errors are always kept
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", 1.0))
+# Requests slower than this are always logged, whatever the sample rate
+LOG_SLOW_REQUEST_MS = float(os.getenv("LOG_SLOW_REQUEST_MS", 1000))
+
+request_id_var = contextvars.ContextVar("request_id", default=None)
+sampled_var = contextvars.ContextVar("sampled", default=True)
+
+logger = logging.getLogger("app.requests")
+
+# Attributes every LogRecord has, anything else was passed through extra= and is logged as a field
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id"}
+
+class ContextFilter(logging.Filter):
+    """Stamps records with the current request id and drops info/debug records of unsampled requests."""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return record.levelno >= logging.WARNING or sampled_var.get()
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.request_id:
+            entry["request_id"] = record.request_id
+        for name, value in vars(record).items():
+            if name not in RECORD_ATTRIBUTES:
+                entry[name] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class DeferredQueueHandler(QueueHandler):
+    """Queues records untouched. The stock prepare() formats the message in the calling thread and drops exc_info,
+    which put tracebacks inside "message" and kept the string interpolation on the hot path."""
+
+    def prepare(self, record):
+        return record
+
+_listener = None
+
+def setup_logging():
+    """Routes every log record through a queue, a background thread does the formatting and writing
+    so logging never blocks the event loop or the scraper threads on stdout."""
+    global _listener
+    if _listener is not None:
+        return
+    log_queue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == "json":
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(LOG_LEVEL)
+    _listener = QueueListener(log_queue, stream_handler)
+    _listener.start()
+    # Flush whatever is still queued on shutdown
+    atexit.register(_listener.stop)
+
+# Latency per route template, so /employees/{id} is one entry rather than one per employee
+route_stats = {}
+_stats_lock = threading.Lock()
+
+def record_request(route, method, status_code, elapsed):
+    metrics.http_requests.inc(route=route, method=method, status=status_code)
+    metrics.http_request_duration.observe(elapsed, route=route, method=method)
+    with _stats_lock:
+        stats = route_stats.setdefault(route, {"count": 0, "errors": 0, "total": 0.0, "max": 0.0})
+        stats["count"] += 1
+        stats["errors"] += status_code >= 500
+        stats["total"] += elapsed
+        stats["max"] = max(stats["max"], elapsed)
+
+def request_stats():
+    with _stats_lock:
+        return {
+            route: {
+                "count": stats["count"],
+                "errors": stats["errors"],
+                "avg_ms": stats["total"] / stats["count"] * 1000,
+                "max_ms": stats["max"] * 1000,
+            }
+            for route, stats in sorted(route_stats.items())
+        }
+
+def route_name(request):
+    route = request.scope.get("route")
+    if route is not None:
+        return route.path
+    # Mounted apps, e.g. /static, do not set the route, the mount's endpoint is the mounted app
+    endpoint = request.scope.get("endpoint")
+    for mount in request.app.routes:
+        if isinstance(mount, Mount) and mount.app is endpoint:
+            return mount.path
+    return "unmatched"
+
+async def request_logging(request, call_next):
+    """HTTP middleware that tags every log line of a request with its id and records its latency."""
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex
+    request_id_token = request_id_var.set(request_id)
+    sampled_token = sampled_var.set(random.random() < LOG_SAMPLE_RATE)
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        elapsed = time.perf_counter() - start
+        route = route_name(request)
+        record_request(route, request.method, status_code, elapsed)
+        # Slow and failed requests are logged as warnings so sampling never hides them
+        level = logging.WARNING if status_code >= 500 or elapsed * 1000 >= LOG_SLOW_REQUEST_MS else logging.INFO
+        logger.log(level, "%s %s %s", request.method, request.url.path, status_code,
+                   extra={"route": route, "status": status_code, "duration_ms": round(elapsed * 1000, 2)})
+        request_id_var.reset(request_id_token)
+        sampled_var.reset(sampled_token)
@@ -0,0 +1,132 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from a fast cached page up to a slow OCR or LLM call
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}  # label values -> value
+        self.lock = threading.Lock()
+        registry.append(self)
+
+    def key(self, labels):
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, key, (), value) for key, value in self.values.items()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for name, key, extra, value in self.samples():
+            lines.append(f"{name}{format_labels(self.labels, key, extra)} {format_value(value)}")
+        return lines
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = value
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        # Per-bucket counts are kept non-cumulative so an observation only touches one slot
+        position = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.values.get(key)
+            if series is None:
+                series = self.values[key] = {"buckets": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            series["buckets"][position] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self.lock:
+            series = [(key, list(value["buckets"]), value["sum"], value["count"]) for key, value in self.values.items()]
+        samples = []
+        for key, buckets, total, count in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), buckets):
+                cumulative += bucket_count
+                samples.append((f"{self.name}_bucket", key, (("le", format_value(bound)),), cumulative))
+            samples.append((f"{self.name}_sum", key, (), total))
+            samples.append((f"{self.name}_count", key, (), count))
+        return samples
+
+# Every metric created in this process, in creation order
+registry = []
+# Called before each scrape to refresh gauges that are cheaper to read than to keep up to date
+collectors = []
+
+def render():
+    """Returns every registered metric in the Prometheus text exposition format."""
+    for collect in collectors:
+        collect()
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+http_requests = Counter("http_requests_total", "HTTP requests handled, by route template, method and status.", ("route", "method", "status"))
+http_request_duration = Histogram("http_request_duration_seconds", "HTTP request latency, by route template and method.", ("route", "method"))
+
+db_query_duration = Histogram("db_query_duration_seconds", "Time spent executing SQL statements, by engine.", ("engine",),
+                              buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+db_pool_wait = Histogram("db_pool_wait_seconds", "Time spent waiting for a pooled connection, by pool.", ("pool",),
+                         buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30))
+db_pool_connections = Gauge("db_pool_connections", "Connections of each pool, by state.", ("pool", "state"))
+
+scraper_stage_duration = Histogram("scraper_stage_duration_seconds", "Duration of each scraper pipeline stage, by source and stage.", ("source", "stage"))
+scraper_documents = Counter("scraper_documents_total", "Documents processed by the scrapers, by source and outcome.", ("source", "outcome"))
+scraper_backlog = Gauge("scraper_backlog", "Documents found but not yet processed, by source.", ("source",))
+scraper_failed = Gauge("scraper_failed_documents", "Documents that used up their attempts and wait for a manual retry, by source.", ("source",))
+ocr_pages = Counter("ocr_pages_total", "PDF pages read, by whether the text came from the text layer or from Tesseract.", ("path",))
+
+upstream_calls = Counter("upstream_calls_total", "Calls to external dependencies, by upstream and outcome.", ("upstream", "outcome"))
+upstream_rate = Gauge("upstream_rate_limit", "Current requests per second allowed to each upstream.", ("upstream",))
+upstream_circuit_open = Gauge("upstream_circuit_open", "1 while the circuit breaker of an upstream is open.", ("upstream",))
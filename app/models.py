@@ -1,4 +1,5 @@
 from sqlmodel import SQLModel, Field
+from sqlalchemy import Index
 from typing import Optional
 
 # Define the User model
@@ -9,8 +10,11 @@ class User(SQLModel, table=True):
 
 # Define the Employee model
 class Employee(SQLModel, table=True):
+    # Supports the (name, id) keyset pagination of the employee list
+    __table_args__ = (Index("ix_employee_name_id", "name", "id"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    name: str
+    name: str = Field(max_length=255)  # Bounded so SQL Server can index it
     position: str
 
 # Define the AgentDecomposition model
@@ -30,4 +34,18 @@ class AgentLog(SQLModel, table=True):
     EndTime: Optional[str] = Field(default=None)
     LastDocumentId: Optional[int] = Field(default=None)
     ErrorLog: Optional[str] = Field(default=None)
-    Source: Optional[str] = Field(default=None, max_length=50)
\ No newline at end of file
+    Source: Optional[str] = Field(default=None, max_length=50)
+
+# Define the AgentLLMUsage model, one row per LLM call made during an agent run
+class AgentLLMUsage(SQLModel, table=True):
+    Id: Optional[int] = Field(default=None, primary_key=True)
+    AgentLogId: Optional[int] = Field(default=None, index=True)
+    DocumentId: Optional[int] = Field(default=None)
+    Source: Optional[str] = Field(default=None, max_length=50)
+    Model: Optional[str] = Field(default=None, max_length=50)
+    PromptTokens: int = Field(default=0)
+    CompletionTokens: int = Field(default=0)
+    LatencyMs: int = Field(default=0)
+    Retries: int = Field(default=0)
+    Cost: float = Field(default=0)
+    CreatedAt: Optional[str] = Field(default=None)
@@ -1,46 +1,119 @@
-from fastapi import APIRouter, Form, Depends, Request, HTTPException
-from fastapi.responses import RedirectResponse
+import csv
+import io
+import json
+import logging
+import os
+import time
+from typing import Optional
+from urllib.parse import urlencode
+
+from fastapi import APIRouter, Form, Depends, Request, HTTPException, UploadFile, File
+from fastapi.responses import RedirectResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from fastapi.templating import Jinja2Templates
-from sqlmodel import Session, select
+from sqlmodel import select, func, or_, and_
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel.ext.asyncio.session import AsyncSession
 from app.models import Employee
-from app.database import get_db
+from app.database import get_async_db, get_engine
+from app.services.search import employee_index, index_employee, unindex_employee
+from app.services import response_cache
+from app.static_assets import static_url
 
 from app.models import Employee
 
+logger = logging.getLogger(__name__)
+
 # Create an APIRouter for employees
 router = APIRouter()
 
 templates = Jinja2Templates(directory="app/templates")
+templates.env.globals["static_url"] = static_url
+
+# Default number of employees per page and the largest page size a client may ask for
+EMPLOYEES_PAGE_SIZE = int(os.getenv("EMPLOYEES_PAGE_SIZE", 20))
+EMPLOYEES_MAX_PAGE_SIZE = int(os.getenv("EMPLOYEES_MAX_PAGE_SIZE", 100))
+# How long the total employee count is reused before it is counted again
+EMPLOYEES_COUNT_TTL = float(os.getenv("EMPLOYEES_COUNT_TTL", 60))
+
+# Rows inserted per executemany transaction by the bulk import, and rows fetched per round-trip by the export
+EMPLOYEES_IMPORT_BATCH_SIZE = int(os.getenv("EMPLOYEES_IMPORT_BATCH_SIZE", 1000))
+EMPLOYEES_EXPORT_BATCH_SIZE = int(os.getenv("EMPLOYEES_EXPORT_BATCH_SIZE", 1000))
 
-# Employee list page
+employee_count_cache = {"value": None, "expires": 0.0}
+
+async def employee_count(db: AsyncSession):
+    if employee_count_cache["value"] is None or employee_count_cache["expires"] < time.monotonic():
+        employee_count_cache["value"] = (await db.exec(select(func.count()).select_from(Employee))).one()
+        employee_count_cache["expires"] = time.monotonic() + EMPLOYEES_COUNT_TTL
+    return employee_count_cache["value"]
+
+def invalidate_employee_count():
+    employee_count_cache["value"] = None
+
+# Employee list page, paged with a (name, id) cursor so every page costs the same index seek
 @router.get("/employees")
-async def employee_page(request: Request, page: int = 1, page_size: int = 2, db: Session = Depends(get_db)):
+async def employee_page(request: Request, after_name: Optional[str] = None, after_id: Optional[int] = None,
+                        before_name: Optional[str] = None, before_id: Optional[int] = None,
+                        page_size: Optional[int] = None, db: AsyncSession = Depends(get_async_db)):
     if "user" not in request.session:
         return RedirectResponse("/login")
-    
-    start = (page - 1) * page_size
-    statement = select(Employee).order_by("name").limit(page_size).offset(start)
-    employees = db.exec(statement).all()
 
-    previous = page - 1 if page > 1 else None
-    next = page + 1 if len(employees) == page_size else None
+    cached = response_cache.cached_response(request)
+    if cached:
+        return cached
 
-    return templates.TemplateResponse("employees/employees.html", {
+    page_size = max(1, min(page_size or EMPLOYEES_PAGE_SIZE, EMPLOYEES_MAX_PAGE_SIZE))
+    backwards = before_name is not None and before_id is not None
+
+    # One extra row tells whether there is another page in the same direction
+    statement = select(Employee).limit(page_size + 1)
+    if backwards:
+        statement = statement.where(or_(Employee.name < before_name, and_(Employee.name == before_name, Employee.id < before_id)))
+        statement = statement.order_by(Employee.name.desc(), Employee.id.desc())
+    else:
+        if after_name is not None and after_id is not None:
+            statement = statement.where(or_(Employee.name > after_name, and_(Employee.name == after_name, Employee.id > after_id)))
+        statement = statement.order_by(Employee.name, Employee.id)
+    employees = (await db.exec(statement)).all()
+
+    more = len(employees) > page_size
+    employees = employees[:page_size]
+    if backwards:
+        employees.reverse()
+        has_previous, has_next = more, True
+    else:
+        has_previous, has_next = after_name is not None and after_id is not None, more
+
+    previous = None
+    next = None
+    if employees and has_previous:
+        previous = "/employees?" + urlencode({"before_name": employees[0].name, "before_id": employees[0].id, "page_size": page_size})
+    if employees and has_next:
+        next = "/employees?" + urlencode({"after_name": employees[-1].name, "after_id": employees[-1].id, "page_size": page_size})
+
+    response = templates.TemplateResponse("employees/employees.html", {
         "request": request,
         "employees": employees,
+        "total": await employee_count(db),
         "previous": previous,
         "next": next
     })
+    return response_cache.cache_response(request, response, tag="employees")
 
 # Delete employee
 @router.post("/employees/{employee_id}/delete")
-async def delete_employee(employee_id: int, request: Request, db: Session = Depends(get_db)):
+async def delete_employee(employee_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
     if "user" not in request.session:
         return RedirectResponse("/login")
     
-    employee = db.get(Employee, employee_id)
-    db.delete(employee)
-    db.commit()
+    employee = await db.get(Employee, employee_id)
+    await db.delete(employee)
+    await db.commit()
+    invalidate_employee_count()
+    unindex_employee(employee_id)
+    response_cache.invalidate("employees")
 
     return RedirectResponse("/employees", status_code=302)
 
@@ -50,40 +123,52 @@ async def add_employee_form(request: Request):
     if "user" not in request.session:
         return RedirectResponse("/login")
     
-    return templates.TemplateResponse("employees/add_employee.html", {"request": request})
+    cached = response_cache.cached_response(request)
+    if cached:
+        return cached
+    response = templates.TemplateResponse("employees/add_employee.html", {"request": request})
+    return response_cache.cache_response(request, response)
 
 # Add employee form submission
 @router.post("/employees/add")
-async def add_employee(name: str = Form(...), position: str = Form(...), request: Request = None, db: Session = Depends(get_db)):
+async def add_employee(name: str = Form(...), position: str = Form(...), request: Request = None, db: AsyncSession = Depends(get_async_db)):
     if "user" not in request.session:
         return RedirectResponse("/login")
 
     new_employee = Employee(name=name, position=position)
     db.add(new_employee)
-    db.commit()
+    await db.commit()
+    invalidate_employee_count()
+    index_employee(new_employee)
+    response_cache.invalidate("employees")
 
     return RedirectResponse("/employees", status_code=302)
 
 # Update employee form page
 @router.get("/employees/{employee_id}/update")
-async def update_employee_form(employee_id: int, request: Request, db: Session = Depends(get_db)):
+async def update_employee_form(employee_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
     if "user" not in request.session:
         return RedirectResponse("/login")
 
-    employee = db.get(Employee, employee_id)
+    cached = response_cache.cached_response(request)
+    if cached:
+        return cached
+
+    employee = await db.get(Employee, employee_id)
 
     if not employee:
         raise HTTPException(status_code=404, detail="Employee not found")
 
-    return templates.TemplateResponse("employees/update_employee.html", {"request": request, "employee": employee})
+    response = templates.TemplateResponse("employees/update_employee.html", {"request": request, "employee": employee})
+    return response_cache.cache_response(request, response, tag="employees")
 
 # Update employee form submission
 @router.post("/employees/{employee_id}/update")
-async def update_employee(employee_id: int, name: str = Form(...), position: str = Form(...), request: Request = None, db: Session = Depends(get_db)):
+async def update_employee(employee_id: int, name: str = Form(...), position: str = Form(...), request: Request = None, db: AsyncSession = Depends(get_async_db)):
     if "user" not in request.session:
         return RedirectResponse("/login")
 
-    employee = db.get(Employee, employee_id)
+    employee = await db.get(Employee, employee_id)
 
     if not employee:
         raise HTTPException(status_code=404, detail="Employee not found")
@@ -93,5 +178,138 @@ async def update_employee(employee_id: int, name: str = Form(...), position: str
     employee.position = position
 
     db.add(employee)
-    db.commit()
-    return RedirectResponse("/employees", status_code=302)
\ No newline at end of file
+    await db.commit()
+    index_employee(employee)
+    response_cache.invalidate("employees")
+    return RedirectResponse("/employees", status_code=302)
+
+class EmployeeImportError(Exception):
+    """An import that stopped part way, committed is the number of rows saved by the batches before the error."""
+
+    def __init__(self, message, committed):
+        super().__init__(message)
+        self.committed = committed
+
+def read_jsonl_rows(text):
+    for number, line in enumerate(text, start=1):
+        if line.strip():
+            try:
+                yield number, json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"line {number}: {e}")
+
+def read_csv_rows(text):
+    reader = csv.DictReader(text)
+    missing = {"name", "position"} - set(reader.fieldnames or [])
+    if missing:
+        raise ValueError(f"the CSV header has no {' or '.join(sorted(missing))} column")
+    for row in reader:
+        yield reader.line_num, row
+
+def employee_field(row, field, number):
+    value = row.get(field)
+    if value is None:
+        return ""
+    if not isinstance(value, str):
+        raise ValueError(f"line {number}: {field} must be a string")
+    return value.strip()
+
+def read_employee_rows(file, filename):
+    """Yields employee dicts from a CSV or JSON-lines upload one line at a time, raising ValueError on a malformed line."""
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    if filename.lower().endswith((".jsonl", ".ndjson")):
+        rows = read_jsonl_rows(text)
+    else:
+        rows = read_csv_rows(text)
+    name_max_length = Employee.__table__.c.name.type.length
+    for number, row in rows:
+        if not isinstance(row, dict):
+            raise ValueError(f"line {number}: expected a JSON object")
+        employee = {"name": employee_field(row, "name", number), "position": employee_field(row, "position", number)}
+        # Checked here, SQL Server would otherwise reject the whole batch
+        if len(employee["name"]) > name_max_length:
+            raise ValueError(f"line {number}: name is longer than {name_max_length} characters")
+        yield employee
+
+def import_employees(file, filename):
+    imported = 0
+    skipped = 0
+    committed = 0
+    batch = []
+
+    def flush():
+        nonlocal committed
+        # One transaction and one executemany per batch, sent in bulk by fast_executemany on SQL Server
+        with get_engine().begin() as conn:
+            conn.execute(insert(Employee), batch)
+        committed += len(batch)
+        batch.clear()
+
+    try:
+        for row in read_employee_rows(file, filename):
+            if not row["name"] or not row["position"]:
+                skipped += 1
+                continue
+            batch.append(row)
+            imported += 1
+            if len(batch) >= EMPLOYEES_IMPORT_BATCH_SIZE:
+                flush()
+        if batch:
+            flush()
+    except (ValueError, csv.Error, SQLAlchemyError) as e:
+        raise EmployeeImportError(str(e), committed) from e
+    return {"imported": imported, "skipped": skipped}
+
+# Bulk import from a CSV (name,position header) or JSON-lines upload
+@router.post("/employees/import")
+async def bulk_import_employees(request: Request, file: UploadFile = File(...)):
+    if "user" not in request.session:
+        return RedirectResponse("/login")
+
+    try:
+        # Parsing and inserting are blocking, keep them off the event loop
+        result = await run_in_threadpool(import_employees, file.file, file.filename or "")
+    except EmployeeImportError as e:
+        # Rows of earlier batches stay saved, the client needs the count to resume without duplicating them
+        if isinstance(e.__cause__, SQLAlchemyError):
+            logger.error("Employee import failed after %s rows: %s", e.committed, e)
+            raise HTTPException(status_code=500, detail={"error": "Database error while importing", "committed": e.committed})
+        raise HTTPException(status_code=400, detail={"error": f"Invalid employee file: {e}", "committed": e.committed})
+    finally:
+        # Imported rows are picked up by reloading the index on the next search
+        invalidate_employee_count()
+        employee_index.invalidate()
+        response_cache.invalidate("employees")
+    return result
+
+def export_employees(format):
+    # Server-side cursor, rows are fetched in batches instead of all at once
+    with get_engine().connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=EMPLOYEES_EXPORT_BATCH_SIZE).execute(
+            select(Employee.id, Employee.name, Employee.position).order_by(Employee.id)
+        )
+        if format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(["id", "name", "position"])
+            for rows in result.partitions():
+                writer.writerows(rows)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            yield buffer.getvalue()
+        else:
+            for rows in result.partitions():
+                yield "".join(json.dumps({"id": row.id, "name": row.name, "position": row.position}) + "\n" for row in rows)
+
+# Streaming export as CSV or JSON lines
+@router.get("/employees/export")
+async def bulk_export_employees(request: Request, format: str = "csv"):
+    if "user" not in request.session:
+        return RedirectResponse("/login")
+    if format not in ("csv", "jsonl"):
+        raise HTTPException(status_code=400, detail="format must be csv or jsonl")
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(export_employees(format), media_type=media_type,
+                             headers={"Content-Disposition": f"attachment; filename=employees.{format}"})
@@ -0,0 +1,84 @@
+import asyncio
+import logging
+import os
+import time
+
+from fastapi import APIRouter, Depends, Request, HTTPException
+from fastapi.responses import RedirectResponse
+from starlette.concurrency import run_in_threadpool
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.models import Employee, AgentDecomposition
+from app.database import get_async_db
+from app.services.search import employee_index, regulation_index, employee_document, decomposition_document
+
+logger = logging.getLogger(__name__)
+
+# Create an APIRouter for search
+router = APIRouter()
+
+# Indexes are reloaded from the database after this many seconds, to pick up writes made by other processes
+SEARCH_INDEX_TTL = float(os.getenv("SEARCH_INDEX_TTL", 300))
+SEARCH_MAX_LIMIT = 100
+
+indexes = {
+    "employees": (employee_index, Employee, employee_document),
+    "regulations": (regulation_index, AgentDecomposition, decomposition_document),
+}
+build_locks = {kind: asyncio.Lock() for kind in indexes}
+# Background reloads in flight, a reference is kept so the task is not garbage collected
+reload_tasks = {}
+
+async def rebuild_index(kind, db: AsyncSession):
+    index, model, to_document = indexes[kind]
+    index.begin_rebuild()
+    try:
+        rows = (await db.exec(select(model))).all()
+        # Tokenizing every row is CPU work, keep it off the event loop
+        await run_in_threadpool(index.rebuild, [to_document(row) for row in rows])
+    except BaseException:
+        index.cancel_rebuild()
+        raise
+
+async def reload_index(kind):
+    async with build_locks[kind]:
+        if not indexes[kind][0].is_stale(SEARCH_INDEX_TTL):
+            return
+        try:
+            async for db in get_async_db():
+                await rebuild_index(kind, db)
+        except Exception:
+            logger.exception("Reloading the %s search index failed", kind)
+
+async def ensure_index(kind, db: AsyncSession):
+    index = indexes[kind][0]
+    if not index.is_stale(SEARCH_INDEX_TTL):
+        return
+    if index.built_at is not None:
+        # Only past its TTL, answer from the current contents while it reloads
+        if kind not in reload_tasks or reload_tasks[kind].done():
+            reload_tasks[kind] = asyncio.create_task(reload_index(kind))
+        return
+    # Never built or invalidated, there is nothing to answer from yet
+    async with build_locks[kind]:
+        if not index.is_stale(SEARCH_INDEX_TTL):
+            return  # Built by the request we were waiting on
+        await rebuild_index(kind, db)
+
+# Ranked search over employees or extracted regulations, query words also match as prefixes
+@router.get("/search")
+async def search(request: Request, q: str, kind: str = "employees", limit: int = 20, db: AsyncSession = Depends(get_async_db)):
+    if "user" not in request.session:
+        return RedirectResponse("/login")
+    if kind not in indexes:
+        raise HTTPException(status_code=400, detail=f"kind must be one of {', '.join(indexes)}")
+
+    await ensure_index(kind, db)
+    start = time.perf_counter()
+    results = indexes[kind][0].search(q, max(1, min(limit, SEARCH_MAX_LIMIT)))
+    return {
+        "query": q,
+        "kind": kind,
+        "took_ms": round((time.perf_counter() - start) * 1000, 3),
+        "results": [{"score": score, **payload} for score, payload in results],
+    }
@@ -1,30 +1,45 @@
 from fastapi import APIRouter, Depends, Request, Form
 from fastapi.responses import RedirectResponse
 from fastapi.templating import Jinja2Templates
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from app.models import User
-from app.database import get_db
-from passlib.context import CryptContext
-
-# Password hashing configuration
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+from app.database import get_async_db
+from app.passwords import hash_password, verify_password
+from app.services import response_cache
+from app.static_assets import static_url
 
 # Create an APIRouter for users
 router = APIRouter()
 templates = Jinja2Templates(directory="app/templates")
+templates.env.globals["static_url"] = static_url
 
 # Login form
 @router.get("/login")
 async def login_form(request: Request):
-    return templates.TemplateResponse("users/login.html", {"request": request})
+    cached = response_cache.cached_response(request)
+    if cached:
+        return cached
+    response = templates.TemplateResponse("users/login.html", {"request": request})
+    return response_cache.cache_response(request, response)
 
 # Login form submission and session management
 @router.post("/login")
-async def login(username: str = Form(...), password: str = Form(...), request: Request = None, db: Session = Depends(get_db)):
+async def login(username: str = Form(...), password: str = Form(...), request: Request = None, db: AsyncSession = Depends(get_async_db)):
     statement = select(User).where(User.username == username)
-    user = db.exec(statement).first()
-    if not user or not pwd_context.verify(password, user.hashed_password):
+    user = (await db.exec(statement)).first()
+    if not user:
+        return templates.TemplateResponse("users/login.html", {"request": request, "error": "Invalid credentials"})
+
+    valid, new_hash = await verify_password(password, user.hashed_password)
+    if not valid:
         return templates.TemplateResponse("users/login.html", {"request": request, "error": "Invalid credentials"})
+
+    # Upgrade the stored hash when the argon2 parameters have changed
+    if new_hash:
+        user.hashed_password = new_hash
+        db.add(user)
+        await db.commit()
     
     # Store the logged-in user in the session
     request.session["user"] = username
@@ -33,14 +48,18 @@ async def login(username: str = Form(...), password: str = Form(...), request: R
 # Route to render the Add User form
 @router.get("/users/add")
 async def add_user_form(request: Request):
-    return templates.TemplateResponse("users/add_user.html", {"request": request})
+    cached = response_cache.cached_response(request)
+    if cached:
+        return cached
+    response = templates.TemplateResponse("users/add_user.html", {"request": request})
+    return response_cache.cache_response(request, response)
 
 # Add a new user
 @router.post("/users/add")
-async def add_user(username: str = Form(...), password: str = Form(...), db: Session = Depends(get_db)):
-    hashed_password = pwd_context.hash(password)
+async def add_user(username: str = Form(...), password: str = Form(...), db: AsyncSession = Depends(get_async_db)):
+    hashed_password = await hash_password(password)
     new_user = User(username=username, hashed_password=hashed_password)
     db.add(new_user)
-    db.commit()
+    await db.commit()
     
     return RedirectResponse("/users/add", status_code=302)
@@ -0,0 +1,65 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from passlib.context import CryptContext
+
+# argon2 parameters, changing any of them makes existing hashes get upgraded on the next login
+ARGON2_SETTINGS = {
+    f"argon2__{name}": int(os.getenv(f"ARGON2_{name.upper()}"))
+    for name in ("time_cost", "memory_cost", "parallelism")
+    if os.getenv(f"ARGON2_{name.upper()}")
+}
+
+# Password hashing configuration
+pwd_context = CryptContext(schemes=["argon2"], deprecated="auto", **ARGON2_SETTINGS)
+
+# At most this many hashes run at once, the rest wait their turn in the pool's queue.
+# argon2 releases the GIL, so threads hash in parallel without blocking the event loop.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 4))
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="argon2")
+
+hash_stats = {"count": 0, "queued": 0, "queue_total": 0.0, "queue_max": 0.0, "run_total": 0.0}
+_stats_lock = threading.Lock()
+
+async def run_in_hash_pool(fn, *args):
+    submitted = time.perf_counter()
+    with _stats_lock:
+        hash_stats["queued"] += 1
+
+    def timed():
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            waited = started - submitted
+            with _stats_lock:
+                hash_stats["queued"] -= 1
+                hash_stats["count"] += 1
+                hash_stats["queue_total"] += waited
+                hash_stats["queue_max"] = max(hash_stats["queue_max"], waited)
+                hash_stats["run_total"] += time.perf_counter() - started
+
+    return await asyncio.get_running_loop().run_in_executor(_executor, timed)
+
+async def hash_password(password):
+    return await run_in_hash_pool(pwd_context.hash, password)
+
+async def verify_password(password, hashed_password):
+    """Returns (valid, new_hash), new_hash is set when the stored hash uses outdated argon2 parameters."""
+    return await run_in_hash_pool(pwd_context.verify_and_update, password, hashed_password)
+
+def password_pool_stats():
+    with _stats_lock:
+        stats = dict(hash_stats)
+    count = stats["count"]
+    return {
+        "workers": PASSWORD_HASH_WORKERS,
+        "in_flight": stats["queued"],
+        "completed": count,
+        "queue_avg_ms": stats["queue_total"] / count * 1000 if count else 0.0,
+        "queue_max_ms": stats["queue_max"] * 1000,
+        "hash_avg_ms": stats["run_total"] / count * 1000 if count else 0.0,
+    }
@@ -0,0 +1,47 @@
+import logging
+from datetime import datetime, timezone
+
+from sqlmodel import Session
+
+from app.database import get_engine
+from app.models import AgentLog, AgentLLMUsage
+from app.services import llm_usage
+
+logger = logging.getLogger(__name__)
+
+def now():
+    return datetime.now(timezone.utc).isoformat(sep='T', timespec='seconds')
+
+def start_agent_log(source):
+    """Creates the AgentLog row for a run and returns its id, or None if the database is unavailable."""
+    llm_usage.drain(source)  # Usage left over from an earlier run that could not be saved
+    try:
+        with Session(get_engine()) as db:
+            agent_log = AgentLog(StartTime=now(), Status="RUNNING", Source=source)
+            db.add(agent_log)
+            db.commit()
+            return agent_log.Id
+    except Exception as e:
+        logger.error("An error occurred while creating the agent log: %s", e)
+        return None
+
+def finish_agent_log(agent_log_id, source, status, error=None, last_document_id=None):
+    """Closes the run's AgentLog row and saves the LLM usage recorded during the run alongside it."""
+    records = llm_usage.drain(source)
+    try:
+        with Session(get_engine()) as db:
+            agent_log = db.get(AgentLog, agent_log_id) if agent_log_id else None
+            if agent_log is None:
+                agent_log = AgentLog(Source=source)
+            agent_log.Status = status
+            agent_log.EndTime = now()
+            agent_log.ErrorLog = error
+            agent_log.LastDocumentId = last_document_id
+            db.add(agent_log)
+            db.flush()
+
+            for record in records:
+                db.add(AgentLLMUsage(AgentLogId=agent_log.Id, **{**record, "Source": record["Source"] or source}))
+            db.commit()
+    except Exception as e:
+        logger.error("An error occurred while saving the agent log: %s", e)
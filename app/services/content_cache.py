@@ -0,0 +1,42 @@
+import hashlib
+import os
+
+from diskcache import Cache
+
+from app.services.lazy import Lazy
+
+# Extracted text and LLM extractions keyed by content hash, evicting least recently used entries
+CONTENT_CACHE_SIZE_LIMIT = int(os.getenv("CONTENT_CACHE_SIZE_LIMIT", 512 * 1024 * 1024))
+
+def open_content_cache():
+    cache = Cache("./.cache/content", size_limit=CONTENT_CACHE_SIZE_LIMIT, eviction_policy="least-recently-used")
+    cache.stats(enable=True)
+    return cache
+
+content_cache = Lazy(open_content_cache)
+
+def sha256_text(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def get_text(pdf_hash):
+    return content_cache.get(f"text:{pdf_hash}")  # Returns None on a miss
+
+def set_text(pdf_hash, text):
+    content_cache.set(f"text:{pdf_hash}", text)
+
+def get_regulation(prompt_version, text_hash, model):
+    return content_cache.get(f"regulation:{prompt_version}:{text_hash}:{model}")  # JSON string, None on a miss
+
+def set_regulation(prompt_version, text_hash, model, regulation_json):
+    content_cache.set(f"regulation:{prompt_version}:{text_hash}:{model}", regulation_json)
+
+def cache_stats():
+    hits, misses = content_cache.stats()
+    return {"hits": hits, "misses": misses, "size_bytes": content_cache.volume()}
@@ -0,0 +1,88 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# (connect, read) timeout in seconds applied to every request that does not set its own
+HTTP_TIMEOUT = (float(os.getenv("HTTP_CONNECT_TIMEOUT", 10)), float(os.getenv("HTTP_READ_TIMEOUT", 60)))
+# Number of hosts to keep pools for and the maximum number of open connections per host
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", 10))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", 10))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", 3))
+HTTP_BACKOFF_FACTOR = float(os.getenv("HTTP_BACKOFF_FACTOR", 0.5))
+# Largest file download_file() accepts and the size of the chunks it writes
+DOWNLOAD_MAX_BYTES = int(os.getenv("DOWNLOAD_MAX_BYTES", 50 * 1024 * 1024))
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+class PooledSession(requests.Session):
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", HTTP_TIMEOUT)
+        return super().request(method, url, **kwargs)
+
+def create_session():
+    retry = Retry(
+        total=HTTP_RETRIES,
+        backoff_factor=HTTP_BACKOFF_FACTOR,
+        status_forcelist=(429, 500, 502, 503, 504),
+        # POSTs are only retried when the connection failed, never after the server saw the request
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+        respect_retry_after_header=True,
+        # Hand the last response back so raise_for_status() surfaces the HTTPError as before
+        raise_on_status=False,
+    )
+    # pool_block caps the connections per host instead of opening throwaway extra ones
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE, max_retries=retry, pool_block=True)
+    session = PooledSession()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+# Shared keep-alive session for all outbound calls
+session = create_session()
+
+def download_file(url, dest_path, max_bytes=DOWNLOAD_MAX_BYTES):
+    """Streams url into dest_path and returns the SHA-256 of the content.
+
+    The body is written to a temp file next to dest_path and renamed into place once complete,
+    so a failed or oversized download never leaves a partial file behind.
+    """
+    directory = os.path.dirname(dest_path) or "."
+    os.makedirs(directory, exist_ok=True)
+
+    with session.get(url, stream=True) as response:
+        response.raise_for_status()
+        length = response.headers.get("Content-Length")
+        if length and int(length) > max_bytes:
+            raise ValueError(f"{url} is {length} bytes, larger than the {max_bytes} byte limit")
+
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise ValueError(f"{url} is larger than the {max_bytes} byte limit")
+                    digest.update(chunk)
+                    file.write(chunk)
+            os.replace(tmp_path, dest_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    return digest.hexdigest()
+
+async def arequest(method, url, **kwargs):
+    # Runs on the shared pool from async code without blocking the event loop
+    return await asyncio.to_thread(session.request, method, url, **kwargs)
+
+async def aget(url, **kwargs):
+    return await arequest("GET", url, **kwargs)
+
+async def apost(url, **kwargs):
+    return await arequest("POST", url, **kwargs)
@@ -0,0 +1,136 @@
+import os
+import socket
+import threading
+import time
+
+from diskcache import Index
+
+from app.services.lazy import Lazy
+
+# A leased job that is not renewed, checkpointed or completed within this time is handed to another worker
+JOB_LEASE_TIMEOUT = float(os.getenv("JOB_LEASE_TIMEOUT", 900))
+# After this many attempts a job stays in the queue as failed until it is retried by hand
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 5))
+# Delay before a failed job is leased again, doubled after every further failure
+JOB_RETRY_DELAY = float(os.getenv("JOB_RETRY_DELAY", 60))
+
+class LeaseLost(Exception):
+    """The job's lease expired and another worker has taken it over."""
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+class JobQueue:
+    """Durable FIFO of work items stored in SQLite through diskcache, shared by every process on the machine.
+
+    A job is leased by one worker at a time and records a checkpoint after every completed stage, so a
+    worker that crashes or is killed only loses the stage it was in: once the lease times out another
+    worker resumes the job from its last checkpoint.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        # Index keeps insertion order, so jobs are leased in the order they were queued
+        # Opened on first use, importing a module that defines a queue does not touch the disk
+        self.jobs = Lazy(lambda: Index(f"./.cache/jobs/{name}"))
+
+    def enqueue(self, job_id, data):
+        """Queues a job unless one with the same id is already queued, returns whether it was added."""
+        with self.jobs.transact():
+            if job_id in self.jobs:
+                return False
+            self.jobs[job_id] = {
+                "id": job_id,
+                "data": data,
+                "checkpoints": {},  # stage -> saved result
+                "status": "pending",
+                "attempts": 0,
+                "available_at": 0.0,
+                "lease_owner": None,
+                "lease_expires": 0.0,
+                "error": None,
+            }
+            return True
+
+    def lease(self, owner):
+        """Leases the oldest job that is neither failed, leased nor waiting for a retry, or returns None."""
+        now = time.time()
+        with self.jobs.transact():
+            for job_id, job in self.jobs.items():
+                if job["status"] == "failed" or job["available_at"] > now:
+                    continue
+                if job["lease_owner"] and job["lease_expires"] > now:
+                    continue
+                if job["attempts"] >= JOB_MAX_ATTEMPTS:
+                    # The last attempt never came back, the worker running it died
+                    job.update(status="failed", lease_owner=None, error=job["error"] or "Lease expired")
+                    self.jobs[job_id] = job
+                    continue
+                job.update(status="leased", lease_owner=owner, lease_expires=now + JOB_LEASE_TIMEOUT, attempts=job["attempts"] + 1)
+                self.jobs[job_id] = job
+                return job
+        return None
+
+    def _update(self, job, **changes):
+        with self.jobs.transact():
+            current = self.jobs.get(job["id"])
+            if current is None or current["lease_owner"] != job["lease_owner"]:
+                raise LeaseLost(f"Job {job['id']} in queue {self.name} is no longer leased by {job['lease_owner']}")
+            current.update(changes)
+            self.jobs[job["id"]] = current
+        job.update(changes)
+
+    def renew(self, job):
+        """Extends the lease, for a worker that is about to start a long stage."""
+        self._update(job, lease_expires=time.time() + JOB_LEASE_TIMEOUT)
+
+    def checkpoint(self, job, stage, result):
+        """Saves a completed stage and renews the lease, job["checkpoints"] is updated in place."""
+        job["checkpoints"][stage] = result
+        self._update(job, checkpoints=job["checkpoints"], lease_expires=time.time() + JOB_LEASE_TIMEOUT)
+
+    def complete(self, job):
+        with self.jobs.transact():
+            current = self.jobs.get(job["id"])
+            if current is not None and current["lease_owner"] == job["lease_owner"]:
+                del self.jobs[job["id"]]
+
+    def fail(self, job, error):
+        """Releases the job for a later retry, keeping its checkpoints, or marks it failed after the last attempt."""
+        if job["attempts"] >= JOB_MAX_ATTEMPTS:
+            self._update(job, status="failed", lease_owner=None, error=str(error))
+        else:
+            delay = JOB_RETRY_DELAY * 2 ** (job["attempts"] - 1)
+            self._update(job, status="pending", lease_owner=None, available_at=time.time() + delay, error=str(error))
+
+    def release(self, job, delay, error=None):
+        """Gives the job back without counting the attempt, for work that never reached the upstream."""
+        self._update(job, status="pending", lease_owner=None, attempts=job["attempts"] - 1,
+                     available_at=time.time() + delay, error=str(error) if error else job["error"])
+
+    def dead_letter(self, job, error):
+        """Marks the job failed straight away, for errors that no retry can fix."""
+        self._update(job, status="failed", lease_owner=None, error=str(error))
+
+    def retry(self, job_id):
+        """Puts a failed job back in the queue with a fresh set of attempts."""
+        with self.jobs.transact():
+            job = self.jobs.get(job_id)
+            if job is None:
+                return False
+            job.update(status="pending", attempts=0, available_at=0.0, lease_owner=None)
+            self.jobs[job_id] = job
+            return True
+
+    def pending(self):
+        """Number of jobs that are still to be processed, leased ones included."""
+        return sum(1 for job in self.jobs.values() if job["status"] != "failed")
+
+    def failed(self):
+        return [job for job in self.jobs.values() if job["status"] == "failed"]
+
+    def status(self):
+        counts = {"pending": 0, "leased": 0, "failed": 0}
+        for job in self.jobs.values():
+            counts[job["status"]] += 1
+        return counts
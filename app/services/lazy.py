@@ -0,0 +1,43 @@
+import threading
+
+class Lazy:
+    """Stands in for an object that is only built on first use, so importing a module never opens
+    cache directories or constructs SDK clients that the current process may not need."""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._value = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        if self._value is None:
+            with self._lock:
+                if self._value is None:
+                    self._value = self._factory()
+        return self._value
+
+    @property
+    def created(self):
+        return self._value is not None
+
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
+
+    # Special methods are looked up on the type, so the container ones are forwarded explicitly
+    def __contains__(self, key):
+        return key in self.load()
+
+    def __len__(self):
+        return len(self.load())
+
+    def __iter__(self):
+        return iter(self.load())
+
+    def __getitem__(self, key):
+        return self.load()[key]
+
+    def __setitem__(self, key, value):
+        self.load()[key] = value
+
+    def __delitem__(self, key):
+        del self.load()[key]
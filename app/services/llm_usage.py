@@ -0,0 +1,86 @@
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+# USD per million (prompt, completion) tokens
+LLM_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+}
+# Overrides in the form "model=prompt/completion,model=prompt/completion"
+for item in filter(None, os.getenv("LLM_PRICES", "").split(",")):
+    model, prices = item.split("=")
+    prompt_price, completion_price = prices.split("/")
+    LLM_PRICES[model.strip()] = (float(prompt_price), float(completion_price))
+
+# Usage records of the current run of each source, saved with its AgentLog row by app.services.agent_log.
+# Sources run side by side, so each run only takes its own records.
+_pending = {}
+_lock = threading.Lock()
+
+def cost_of(model, prompt_tokens, completion_tokens):
+    prompt_price, completion_price = LLM_PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+def parse_with_usage(client, document_id=None, source=None, **kwargs):
+    """Calls client.beta.chat.completions.parse(**kwargs) and records tokens, wall time, retries and cost."""
+    start = time.perf_counter()
+    raw = client.beta.chat.completions.with_raw_response.parse(**kwargs)
+    completion = raw.parse()
+    elapsed = time.perf_counter() - start
+
+    usage = completion.usage
+    prompt_tokens = usage.prompt_tokens if usage else 0
+    completion_tokens = usage.completion_tokens if usage else 0
+    record = {
+        "DocumentId": document_id,
+        "Source": source,
+        "Model": kwargs["model"],
+        "PromptTokens": prompt_tokens,
+        "CompletionTokens": completion_tokens,
+        "LatencyMs": int(elapsed * 1000),
+        "Retries": raw.retries_taken,
+        "Cost": cost_of(kwargs["model"], prompt_tokens, completion_tokens),
+        "CreatedAt": datetime.now(timezone.utc).isoformat(sep='T', timespec='seconds'),
+    }
+    with _lock:
+        _pending.setdefault(source, []).append(record)
+    return completion
+
+def drain(source):
+    """Returns and clears the usage records of a source collected since the last call."""
+    with _lock:
+        return _pending.pop(source, [])
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(pct / 100 * len(values)) - 1))
+    return values[index]
+
+def summarize(rows):
+    """Aggregates AgentLLMUsage rows per model."""
+    models = {}
+    for row in rows:
+        models.setdefault(row.Model, []).append(row)
+
+    summary = {}
+    for model, model_rows in models.items():
+        latencies = [row.LatencyMs for row in model_rows]
+        summary[model] = {
+            "calls": len(model_rows),
+            "documents": len({row.DocumentId for row in model_rows if row.DocumentId is not None}),
+            "prompt_tokens": sum(row.PromptTokens for row in model_rows),
+            "completion_tokens": sum(row.CompletionTokens for row in model_rows),
+            "retries": sum(row.Retries for row in model_rows),
+            "cost": round(sum(row.Cost for row in model_rows), 6),
+            "latency_ms": {
+                "p50": percentile(latencies, 50),
+                "p90": percentile(latencies, 90),
+                "p99": percentile(latencies, 99),
+                "max": max(latencies),
+            },
+        }
+    return summary
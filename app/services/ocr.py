@@ -0,0 +1,129 @@
+import logging
+import math
+import os
+import subprocess
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app import metrics
+
+logger = logging.getLogger(__name__)
+
+# Number of processes running Tesseract and how many pages each task rasterizes at a time
+OCR_PROCESSES = int(os.getenv("OCR_PROCESSES", os.cpu_count() or 1))
+OCR_CHUNK_PAGES = int(os.getenv("OCR_CHUNK_PAGES", 4))
+OCR_DPI = int(os.getenv("OCR_DPI", 200))
+# Pages whose embedded text has fewer letters and digits than this are treated as scanned images
+TEXT_LAYER_MIN_CHARS = int(os.getenv("OCR_TEXT_LAYER_MIN_CHARS", 40))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _init_worker():
+    # Parallelism comes from the pool, stop each tesseract process from spawning its own threads
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=OCR_PROCESSES, initializer=_init_worker)
+    return _pool
+
+def reset_pool(broken):
+    """Replaces a pool whose worker died, e.g. OOM-killed, it refuses every later task otherwise."""
+    global _pool
+    with _pool_lock:
+        # Another thread may have replaced it already
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+# pytesseract and pdf2image are imported where they are used, most documents never reach Tesseract
+
+def count_pages(pdf_path):
+    from pdf2image import pdfinfo_from_path
+    return pdfinfo_from_path(pdf_path)["Pages"]
+
+def ocr_page_range(pdf_path, first_page, last_page):
+    # Runs in a worker process, only this range of pages is ever held in memory as images
+    import pytesseract
+    from pdf2image import convert_from_path
+    images = convert_from_path(pdf_path, dpi=OCR_DPI, first_page=first_page, last_page=last_page)
+    return {first_page + i: pytesseract.image_to_string(image) for i, image in enumerate(images)}
+
+def page_ranges(pages, chunk_pages):
+    # Group sorted page numbers into contiguous (first, last) ranges of at most chunk_pages pages
+    ranges = []
+    for page in sorted(pages):
+        if ranges and ranges[-1][1] == page - 1 and page - ranges[-1][0] < chunk_pages:
+            ranges[-1] = (ranges[-1][0], page)
+        else:
+            ranges.append((page, page))
+    return ranges
+
+def ocr_pages(pdf_path, pages):
+    """OCRs the given page numbers across the process pool and returns {page: text}."""
+    if not pages:
+        return {}
+    # Small documents are split finely enough to keep every process busy
+    chunk_pages = max(1, min(OCR_CHUNK_PAGES, math.ceil(len(pages) / OCR_PROCESSES)))
+    ranges = page_ranges(pages, chunk_pages)
+    pool = get_pool()
+    try:
+        return ocr_ranges(pool, pdf_path, ranges)
+    except BrokenProcessPool as e:
+        logger.warning("OCR process pool broke while reading %s, retrying on a new pool: %s", pdf_path, e)
+        reset_pool(pool)
+        return ocr_ranges(get_pool(), pdf_path, ranges)
+
+def ocr_ranges(pool, pdf_path, ranges):
+    futures = [pool.submit(ocr_page_range, pdf_path, first, last) for first, last in ranges]
+    page_texts = {}
+    for future in futures:
+        page_texts.update(future.result())
+    return page_texts
+
+def format_pages(page_texts):
+    text = ""
+    for page in sorted(page_texts):
+        text += f"\n--- Page {page} ---\n"
+        text += page_texts[page]
+    return text
+
+def extract_text_layer(pdf_path):
+    """Returns {page: text} from the PDF's embedded text layer using poppler's pdftotext."""
+    try:
+        # pdftotext ships with poppler, which pdf2image already requires
+        result = subprocess.run(["pdftotext", "-layout", "-enc", "UTF-8", pdf_path, "-"], capture_output=True, check=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.warning("Could not read the text layer of %s, falling back to OCR: %s", pdf_path, e)
+        return {}
+    # Pages are separated by form feeds
+    pages = result.stdout.decode("utf-8", errors="replace").split("\f")
+    return {i + 1: text for i, text in enumerate(pages)}
+
+def has_text_layer(text):
+    return sum(1 for char in text if char.isalnum()) >= TEXT_LAYER_MIN_CHARS
+
+def extract_pdf_text(pdf_path):
+    """Reads born-digital pages from the text layer and OCRs only the image-only pages.
+
+    Returns the text with '--- Page N ---' markers and the number of pages that took each path.
+    """
+    page_count = count_pages(pdf_path)
+    text_layer = extract_text_layer(pdf_path)
+
+    page_texts = {page: text_layer[page] for page in range(1, page_count + 1) if has_text_layer(text_layer.get(page, ""))}
+    scanned = [page for page in range(1, page_count + 1) if page not in page_texts]
+    page_texts.update(ocr_pages(pdf_path, scanned))
+
+    stats = {"pages": page_count, "text_layer": page_count - len(scanned), "ocr": len(scanned)}
+    metrics.ocr_pages.inc(stats["text_layer"], path="text_layer")
+    metrics.ocr_pages.inc(stats["ocr"], path="ocr")
+    return format_pages(page_texts), stats
+
+def ocr_pdf(pdf_path):
+    text, _ = extract_pdf_text(pdf_path)
+    return text
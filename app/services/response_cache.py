@@ -0,0 +1,109 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import Response
+
+# Number of rendered responses kept in memory and how long each one stays valid
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", 256))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", 60))
+# Set to a directory to share the cache (and its invalidations) between worker processes through diskcache
+RESPONSE_CACHE_DIR = os.getenv("RESPONSE_CACHE_DIR")
+
+class MemoryBackend:
+    """LRU of cached responses with tag based invalidation."""
+
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.tags = {}  # tag -> keys
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry["expires"] < time.monotonic():
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry, tag):
+        with self.lock:
+            self._remove(key)
+            entry["expires"] = time.monotonic() + RESPONSE_CACHE_TTL
+            entry["tag"] = tag
+            self.entries[key] = entry
+            if tag:
+                self.tags.setdefault(tag, set()).add(key)
+            while len(self.entries) > self.size:
+                self._remove(next(iter(self.entries)))
+
+    def _remove(self, key):
+        # Expired and evicted keys leave their tag too, or every distinct URL would stay in it until the next invalidation
+        entry = self.entries.pop(key, None)
+        if entry is None or not entry["tag"]:
+            return
+        keys = self.tags.get(entry["tag"])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.tags[entry["tag"]]
+
+    def invalidate(self, tag):
+        with self.lock:
+            for key in self.tags.pop(tag, set()):
+                self.entries.pop(key, None)
+
+class DiskBackend:
+    def __init__(self, directory):
+        from diskcache import Cache
+        self.cache = Cache(directory, eviction_policy="least-recently-used")
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, entry, tag):
+        self.cache.set(key, entry, expire=RESPONSE_CACHE_TTL, tag=tag)
+
+    def invalidate(self, tag):
+        self.cache.evict(tag)
+
+backend = DiskBackend(RESPONSE_CACHE_DIR) if RESPONSE_CACHE_DIR else MemoryBackend(RESPONSE_CACHE_SIZE)
+
+def cache_key(request):
+    # Route, query parameters and the logged-in user all change what a page shows
+    query = "&".join(f"{name}={value}" for name, value in sorted(request.query_params.multi_items()))
+    return f"{request.url.netloc}{request.url.path}?{query}#{request.session.get('user', '')}"
+
+def not_modified(request, etag):
+    return etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]
+
+def cached_response(request):
+    """Returns the cached response for this request, a 304 if the browser already has it, or None."""
+    entry = backend.get(cache_key(request))
+    if entry is None:
+        return None
+    headers = {"ETag": entry["etag"], "Cache-Control": "private, no-cache"}
+    if not_modified(request, entry["etag"]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry["body"], media_type=entry["media_type"], headers=headers)
+
+def cache_response(request, response, tag=None):
+    """Stores a rendered response, tagged so the handlers that change its data can invalidate it."""
+    if response.status_code != 200:
+        return response
+    etag = '"' + hashlib.sha1(response.body).hexdigest() + '"'
+    backend.set(cache_key(request), {"body": response.body, "media_type": response.media_type, "etag": etag}, tag)
+    if not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+def invalidate(tag):
+    backend.invalidate(tag)
@@ -10,8 +10,10 @@ from dotenv import load_dotenv
 from diskcache import Cache
 from datetime import datetime
 
-import pytesseract
-from pdf2image import convert_from_path
+from app.services.ocr import ocr_pdf
+from app.services.http_client import session
+from app.services.llm_usage import parse_with_usage
+from app.services.agent_log import start_agent_log, finish_agent_log
 
 load_dotenv()
 
@@ -134,7 +136,9 @@ def extract_rules(circular: Circular) -> Rules:
   **Circular Content:**
   {circular.content}
   """
-  completion = llm.beta.chat.completions.parse(
+  completion = parse_with_usage(
+    llm,
+    source="CBN",
     model="gpt-4o-mini",
     messages=[
       {"role": "system", "content": prompt},
@@ -154,7 +158,7 @@ def do_main():
     url = "https://www.cbn.gov.ng/api/GetAllCirculars?format=json"
 
     # Send a GET request to the page
-    response = requests.get(url)
+    response = session.get(url)
     response.raise_for_status()  # Check that the request was successful
 
     # Find all circular entries
@@ -172,7 +176,7 @@ def do_main():
         file_name = linkHref.split('/')[-1]
         safe_file_name = re.sub(r'[^a-zA-Z0-9_\-\.]', '_', file_name)
 
-        response = requests.get(linkHref)
+        response = session.get(linkHref)
         response.raise_for_status()  # Ensure the request was successful
 
         # Save the PDF to a file
@@ -187,14 +191,8 @@ def do_main():
         # pdf_url = upload_content_to_gcs(response.content, safe_file_name)
         # text = extract_text_from_pdf(pdf_url)
 
-        # Convert PDF pages to images
-        images = convert_from_path(pdf_path)
-
-        # Extract text from each image
-        text = ""
-        for i, image in enumerate(images):
-            text += f"\n--- Page {i+1} ---\n"
-            text += pytesseract.image_to_string(image)
+        # Rasterize and OCR the pages in parallel
+        text = ocr_pdf(pdf_path)
 
         # Print or save extracted text
 
@@ -243,7 +241,7 @@ def do_main():
         print(payload)
 
         # Send the API request
-        response = requests.post(
+        response = session.post(
             RULEBOOK_API_INVENTORY_URL,
             headers={
             'accept': 'text/plain',
@@ -287,7 +285,7 @@ def log_agent_request(status=None, error=None):
             token = get_token()
 
         # Send the API request
-        response = requests.post(
+        response = session.post(
             RULEBOOK_API_AI_LOG_URL,
             headers={
             'accept': 'text/plain',
@@ -310,7 +308,7 @@ def log_agent_request(status=None, error=None):
         if error:
             print(f"Additional error information: {error}")
 def request_auth():
-    response = requests.post(
+    response = session.post(
         RULEBOOK_API_AUTH_URL,
         headers={
             'accept': '*/*',
@@ -329,9 +327,12 @@ def request_auth():
 
 if __name__ == '__main__':
     log_agent_request(0)
+    agent_log_id = start_agent_log("CBN")
     try:
         do_main()
         log_agent_request(1)
+        finish_agent_log(agent_log_id, "CBN", "SUCCESS")
     except Exception as e:  
         log_agent_request(2, str(e))
+        finish_agent_log(agent_log_id, "CBN", "FAILED", str(e))
         print(e)
\ No newline at end of file
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from diskcache import Cache
+
+from app.services.lazy import Lazy
+
+logger = logging.getLogger(__name__)
+
+# Base interval between cycles, the range adaptive backoff moves within, and the random jitter fraction
+SCHEDULER_INTERVAL = float(os.getenv("SCHEDULER_INTERVAL", 300))
+SCHEDULER_MIN_INTERVAL = float(os.getenv("SCHEDULER_MIN_INTERVAL", 30))
+SCHEDULER_MAX_INTERVAL = float(os.getenv("SCHEDULER_MAX_INTERVAL", 1800))
+SCHEDULER_JITTER = float(os.getenv("SCHEDULER_JITTER", 0.1))
+# A lock older than this is assumed to belong to a crashed process
+SCHEDULER_LOCK_TIMEOUT = float(os.getenv("SCHEDULER_LOCK_TIMEOUT", 3600))
+
+# Shared between processes so two app workers never run the same job at once
+lock_cache = Lazy(lambda: Cache("./.cache/scheduler"))
+
+# Every scheduler created in this process, by name
+schedulers = {}
+
+class Scheduler:
+    """Runs a blocking job on the asyncio loop at adaptive intervals, never overlapping itself.
+
+    job() returns normally on success and raises on failure. queue_depth() reports how many
+    work items are still waiting, which is used to come back sooner while a backlog remains.
+    """
+
+    def __init__(self, name, job, queue_depth=None, interval=SCHEDULER_INTERVAL,
+                 min_interval=SCHEDULER_MIN_INTERVAL, max_interval=SCHEDULER_MAX_INTERVAL, jitter=SCHEDULER_JITTER):
+        self.name = name
+        self.job = job
+        self.queue_depth = queue_depth or (lambda: 0)
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.jitter = jitter
+        self.failures = 0
+        self.running = False
+        self.last_started = None
+        self.last_duration = None
+        self.last_status = None
+        self.last_error = None
+        self.next_run = None
+        self._lock = asyncio.Lock()
+        self._task = None
+        schedulers[name] = self
+
+    def next_delay(self):
+        if self.failures:
+            # Exponential backoff on consecutive failures
+            delay = min(self.max_interval, self.min_interval * 2 ** (self.failures - 1))
+        elif self.queue_depth() > 0:
+            # Work is still waiting, come back soon
+            delay = self.min_interval
+        else:
+            delay = self.interval
+        return delay * (1 + random.uniform(-self.jitter, self.jitter))
+
+    async def run_once(self):
+        """Runs one cycle unless one is already in progress here or in another process."""
+        if self._lock.locked():
+            return False
+        async with self._lock:
+            lock_key = f"lock:{self.name}"
+            if not lock_cache.add(lock_key, os.getpid(), expire=SCHEDULER_LOCK_TIMEOUT):
+                return False
+            self.running = True
+            self.last_started = datetime.now(timezone.utc)
+            start = time.perf_counter()
+            try:
+                # Shielded: cancelling the scheduler cannot stop the thread, the cycle finishes and only then frees the lock
+                await asyncio.shield(asyncio.to_thread(self.run_job, lock_key))
+                self.failures = 0
+                self.last_status = "SUCCESS"
+                self.last_error = None
+            except Exception as e:
+                logger.exception("Scheduled job %s failed", self.name)
+                self.failures += 1
+                self.last_status = "FAILED"
+                self.last_error = str(e)
+            self.last_duration = time.perf_counter() - start
+            return True
+
+    def run_job(self, lock_key):
+        # Runs in a worker thread, the lock is released when the job really returns
+        try:
+            self.job()
+        finally:
+            self.running = False
+            lock_cache.delete(lock_key)
+
+    async def run_forever(self):
+        while True:
+            await self.run_once()
+            delay = self.next_delay()
+            self.next_run = datetime.now(timezone.utc) + timedelta(seconds=delay)
+            await asyncio.sleep(delay)
+
+    def start(self):
+        self._task = asyncio.create_task(self.run_forever())
+        return self._task
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def status(self):
+        return {
+            "running": self.running,
+            "next_run": self.next_run.isoformat(timespec='seconds') if self.next_run else None,
+            "last_started": self.last_started.isoformat(timespec='seconds') if self.last_started else None,
+            "last_duration": self.last_duration,
+            "last_status": self.last_status,
+            "last_error": self.last_error,
+            "consecutive_failures": self.failures,
+            "queue_depth": self.queue_depth(),
+        }
@@ -0,0 +1,122 @@
+import importlib
+import os
+import re
+
+from diskcache import Cache
+
+from app.services.http_client import session
+from app.services.job_queue import JobQueue
+from app.services.lazy import Lazy
+from app.services.upstreams import get_upstream
+
+# Modules under app/services/scrappers that define the sources to scrape
+SCRAPER_SOURCES = [name.strip() for name in os.getenv("SCRAPER_SOURCES", "cbn").split(",") if name.strip()]
+
+# Every registered source, by name
+sources = {}
+
+class Source:
+    """A regulator whose documents are scraped.
+
+    Subclasses say where the listing is, how to read its entries and where each document lives,
+    the download, OCR, LLM and upload stages in pipeline.py are shared by every source.
+    """
+
+    name = None  # Stored as AgentLog.Source and AgentDecomposition.source, e.g. "CBN"
+    site_name = None  # Sent to the Rulebook AI log, e.g. "Central Bank of Nigeria"
+    regulator = None  # How the extraction prompt refers to the issuer, e.g. "the Central Bank"
+    listing_url = None
+    # Requests per second sent to the site, overridable with <NAME>_RATE_LIMIT and <NAME>_BURST
+    rate_limit = 2.0
+    # Namespace of the cursor, the seen ids and the job queue, defaults to the lowercased name
+    state_name = None
+
+    def __init__(self):
+        self.state_name = self.state_name or self.name.lower()
+        state_name = self.state_name
+        self.run_cache = Lazy(lambda: Cache(f"./.cache/run/{state_name}"))
+        # Ids of documents that were already processed, so new ones are found by set difference
+        self.seen_cache = Lazy(lambda: Cache(f"./.cache/run/{state_name}_seen"))
+        # Documents waiting to be processed, each one checkpointed after every stage
+        self.queue = JobQueue(self.state_name)
+        # Token bucket and circuit breaker shared by every request to the site
+        self.upstream = get_upstream(self.name.lower(), self.rate_limit)
+        self.documents_dir = f"app/static/{self.name.lower()}/"
+
+    # Listing and documents
+
+    def parse_listing(self, response):
+        """Returns the listing's entries, newest first."""
+        return response.json()
+
+    def entry_id(self, entry):
+        return entry.get("id")
+
+    def document_url(self, entry):
+        raise NotImplementedError
+
+    def describe(self, entry):
+        """Returns the reference, description and date of an entry."""
+        raise NotImplementedError
+
+    def get(self, url, **kwargs):
+        with self.upstream.guard() as call:
+            response = session.get(url, **kwargs)
+            call.record(response)
+        return response
+
+    def fetch_listing(self):
+        # Conditional GET: an unchanged listing costs a 304 and the last copy is reused
+        listing = self.run_cache.get("listing")
+        headers = {}
+        if listing:
+            if listing.get("etag"):
+                headers["If-None-Match"] = listing["etag"]
+            if listing.get("last_modified"):
+                headers["If-Modified-Since"] = listing["last_modified"]
+
+        response = self.get(self.listing_url, headers=headers)
+        if response.status_code == 304 and listing:
+            return listing["entries"]
+        response.raise_for_status()  # Check that the request was successful
+
+        entries = self.parse_listing(response)
+        self.run_cache.set("listing", {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "entries": entries,
+        })
+        return entries
+
+    def document_path(self, entry):
+        """Local path and /static URL of a downloaded document."""
+        file_name = self.document_url(entry).split('/')[-1]
+        safe_file_name = re.sub(r'[^a-zA-Z0-9_\-\.]', '_', file_name)
+        return self.documents_dir + safe_file_name, '/static/' + self.documents_dir[len('app/static/'):] + safe_file_name
+
+    # Cursor and seen ids
+
+    def get_cursor(self):
+        return self.run_cache.get("id")  # Returns None if not set
+
+    def set_cursor(self, id):
+        self.run_cache.set("id", id)
+
+    def mark_seen(self, id):
+        self.seen_cache.set(id, True)
+
+    def is_seen(self, id):
+        return id in self.seen_cache
+
+    def has_seen_any(self):
+        return len(self.seen_cache) > 0
+
+def register(source_class):
+    """Class decorator adding a source to the registry."""
+    sources[source_class.name] = source_class()
+    return source_class
+
+def load_sources():
+    for module in SCRAPER_SOURCES:
+        importlib.import_module(f"app.services.scrappers.{module}")
+    return sources
@@ -0,0 +1,646 @@
+from datetime import datetime, timezone
+from pydantic import BaseModel
+from typing import Literal
+import asyncio
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import requests
+from diskcache import Cache
+from sqlmodel import Session, select
+
+from app import metrics
+from app.database import get_engine
+from app.models import AgentDecomposition
+from app.services.agent_log import start_agent_log, finish_agent_log
+from app.services.content_cache import sha256_text, sha256_file, get_text, set_text, get_regulation, set_regulation, cache_stats
+from app.services.http_client import session, download_file
+from app.services.job_queue import LeaseLost, worker_id
+from app.services.lazy import Lazy
+from app.services.llm_usage import parse_with_usage
+from app.services.ocr import extract_pdf_text
+from app.services.scheduler import Scheduler
+from app.services.search import index_decomposition
+from app.services.upstreams import CircuitOpen, upstreams
+from app.services.scrappers.base import load_sources, sources
+from app.services.scrappers.uploads import enqueue_upload, flush_uploads, upload_queue
+
+logger = logging.getLogger(__name__)
+
+def create_llm():
+    # The SDK takes most of this module's import time, it is only loaded by the first extraction
+    from openai import OpenAI
+    return OpenAI(
+        # api_key=os.getenv("OPENAI_API_KEY"),
+    )
+
+llm = Lazy(create_llm)
+
+RULEBOOK_API_AUTH_URL = os.getenv("RULEBOOK_API_AUTH_URL")
+RULEBOOK_API_AUTH_USERNAME = os.getenv("RULEBOOK_API_AUTH_USERNAME")
+RULEBOOK_API_AUTH_PASSWORD = os.getenv("RULEBOOK_API_AUTH_PASSWORD")
+RULEBOOK_API_AI_LOG_URL = os.getenv("RULEBOOK_API_AI_LOG_URL")
+RULEBOOK_API_AUTH_OTP = os.getenv("RULEBOOK_API_AUTH_OTP")
+RULEBOOK_API_KEY = os.getenv("RULEBOOK_API_KEY")
+
+BASE_URL = os.getenv("BASE_URL")
+
+LLM_MODEL = "gpt-4o-mini"
+# Bump whenever the extraction prompt changes so cached extractions are not reused
+PROMPT_VERSION = "1"
+# "single" sends the whole document in one call, "chunked" always splits it, "auto" only splits long documents
+LLM_EXTRACTION_MODE = os.getenv("LLM_EXTRACTION_MODE", "auto")
+# Approximate number of document tokens sent per call, and how many chunks are extracted at once
+LLM_CHUNK_TOKENS = int(os.getenv("LLM_CHUNK_TOKENS", 8000))
+LLM_CHUNK_WORKERS = int(os.getenv("LLM_CHUNK_WORKERS", 4))
+
+# Number of workers for each stage, shared by every source so OCR and LLM capacity is not multiplied by the number of sources
+PIPELINE_WORKERS = {
+    "download": int(os.getenv("SCRAPER_DOWNLOAD_WORKERS", os.getenv("CBN_DOWNLOAD_WORKERS", 4))),
+    "ocr": int(os.getenv("SCRAPER_OCR_WORKERS", os.getenv("CBN_OCR_WORKERS", 2))),
+    "llm": int(os.getenv("SCRAPER_LLM_WORKERS", os.getenv("CBN_LLM_WORKERS", 4))),
+}
+stage_slots = {stage: threading.BoundedSemaphore(workers) for stage, workers in PIPELINE_WORKERS.items()}
+
+@contextmanager
+def pipeline_stage(source, job, stage):
+    # Runs the block in one of the stage's slots, timing the work itself rather than the wait for a slot
+    with stage_slots[stage]:
+        # The wait for the slot counts against the lease, the stage gets a full JOB_LEASE_TIMEOUT of its own
+        source.queue.renew(job)
+        with metrics.scraper_stage_duration.time(source=source.name, stage=stage):
+            yield
+
+# Create a TTL cache with a single item
+token_cache = Lazy(lambda: Cache("./.cache/auth"))
+# SHA-256 of the last download of each document URL
+downloads_cache = Lazy(lambda: Cache("./.cache/downloads"))
+
+# How often a standalone worker looks for new jobs
+JOB_POLL_INTERVAL = float(os.getenv("SCRAPER_JOB_POLL_INTERVAL", os.getenv("CBN_JOB_POLL_INTERVAL", 30)))
+
+# Documents found by the last run of each source that are still waiting to be processed
+pipeline_status = {}
+
+def set_backlog(source):
+    counts = source.queue.status()
+    pipeline_status[source.name] = counts["pending"] + counts["leased"]
+    metrics.scraper_backlog.set(pipeline_status[source.name], source=source.name)
+    metrics.scraper_failed.set(counts["failed"], source=source.name)
+
+class NothingToProcess(ValueError):
+    pass
+
+class DocumentsFailed(Exception):
+    """Documents that used up their attempts hold the cursor back until they are retried from /admin/scrapers/failed."""
+
+def set_auth(auth):
+    expires_at = datetime.strptime(auth["expires"], "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+    now = datetime.now(timezone.utc)
+    ttl = (expires_at - now).total_seconds()
+    
+    if ttl > 0:  # Ensure TTL is valid
+        token_cache.set("token", auth["token"], expire=ttl)  # Set with expiration time
+
+def get_token():
+    return token_cache.get("token")  # Returns None if expired or not set
+
+class Circular:
+    id:int
+    source:str
+    regulator:str
+    reference:str
+    link:str
+    description:str
+    date:str
+    content:str
+
+class Rule(BaseModel):
+    id: str
+    title: str
+    description: str
+    units: list[Literal['IT', 'RISK','COMPLIANCE']]
+    type: Literal['CIRCULAR', 'GUIDELINE', 'UPDATED GUIDELINE']
+    date: str
+
+class Rules(BaseModel):
+    rules: list[Rule]
+
+class Section(BaseModel):
+    title: str
+    description: str
+    action_plan: str
+    sanctions: str
+    requires_regulatory_returns: bool
+    frequency_of_returns: str
+    units: list[Literal['IT', 'RISK','COMPLIANCE']]
+    timeline_date: str
+
+class Regulation(BaseModel):
+    title: str
+    reference:str
+    link:str
+    type: Literal['ACT', 'GUIDELINES', 'CIRCULARS']
+    description:str
+    release_date:str
+    effective_date:str
+    last_ammend_date:str
+    regulatory_status:Literal['ACTIVE', 'REPEALED', 'SUPERSEDED']
+    sections: list[Section]
+ 
+def extract_rules(circular: Circular) -> Rules:
+  prompt = """
+  As a compliance officer or regulatory analyst within a financial institution, your objective is to break down regulatory communications issued by {regulator}, that you received from the user into individual actionable compliance measures (rules). 
+ 
+  title: Identify the document reference number.
+  reference: Identify the document reference number.
+  link: The URL of the document.
+  type: One of ['ACT', 'GUIDELINES', 'CIRCULARS'] that describes the document type.
+  description: A brief summary of the document.
+  release_date: Identify the date of document.
+  effective_date: Identify the effective date of the regulation.
+  last_ammend_date: Identify the last amendment date of the regulation.
+  regulatory_status: On of ['ACTIVE', 'REPEALED', 'SUPERSEDED'] that describes the status of the regulation.
+
+  List out all phrases or statements that meet the following criteria as the communication action points:
+  - Statements that prohibit explicitly defined actions or behaviors. 
+  - Statements that outline specific requirements, obligations, or responsibilities.
+  - Deadlines, timelines, or effective dates mentioned in the circular.
+  - Implement regulatory changes or comply with new requirements.
+  - Reporting to regulatory authorities or maintaining documentation.
+  - References to training or awareness programs that may be required for compliance. 
+  - Exceptions or exemptions mentioned in the circular. 
+  - Guidance on risk management practices or control measures
+  - Outline of the consequences of non-compliance. 
+
+  Review the action points for actionability within FSI compliance context and match items with similarity rating of more than 50% and merge them into one statement. 
+  List out the final list of action points. 
+  For each of the final list of action points:
+  - compose the full instructions relating to it as stated in the document as a rule:
+  -- Identify id of the rule as [document reference number]-[rule number]
+  -- Identify Title, detailed information including all instructions, references, action plan, sactions, if regulatory returns are required, frequency of returns, recommendations and dates as Rule Description, Date as [date of document], all applicable Unit(s) that needs the rule and the Type.
+  title: str
+    description: str
+    action_plan: str
+    sanctions: str
+    requires_regulatory_returns: bool
+    frequency_of_returns: str
+    units: list[Literal['IT', 'RISK','COMPLIANCE']]
+    type: Literal['CIRCULAR', 'GUIDELINE', 'UPDATED GUIDELINE']
+    timeline_date: str
+
+  Convert the final list of action points into the given structure.
+  """.replace("{regulator}", circular.regulator)
+  content = circular_message(circular, circular.content)
+  # Retries and reprocessing of the same content reuse the earlier extraction
+  content_hash = sha256_text(content)
+  cached = get_regulation(PROMPT_VERSION, content_hash, LLM_MODEL)
+  if cached is not None:
+    return Regulation.model_validate_json(cached)
+
+  if LLM_EXTRACTION_MODE == "single" or (LLM_EXTRACTION_MODE == "auto" and estimate_tokens(circular.content) <= LLM_CHUNK_TOKENS):
+    regulation = parse_regulation(prompt, content, circular.id, circular.source)
+  else:
+    # Map: extract each chunk concurrently, reduce: merge the partial regulations
+    chunks = split_text(circular.content, LLM_CHUNK_TOKENS)
+    with ThreadPoolExecutor(max_workers=LLM_CHUNK_WORKERS) as executor:
+      parts = list(executor.map(
+        lambda numbered: parse_regulation(prompt, circular_message(circular, numbered[1], numbered[0], len(chunks)), circular.id, circular.source),
+        enumerate(chunks, start=1)
+      ))
+    regulation = merge_regulations(parts)
+
+  set_regulation(PROMPT_VERSION, content_hash, LLM_MODEL, regulation.model_dump_json())
+  return regulation
+
+def circular_message(circular: Circular, text, part=1, parts=1):
+  label = "**Circular Content:**" if parts == 1 else f"**Circular Content (part {part} of {parts}):**"
+  return f"""
+  #Reference: {circular.reference}
+  #Link: {circular.link}
+  #Description: {circular.description}
+  #Publish Date: {circular.date}
+  {label}
+  {text}
+  """
+
+def parse_regulation(prompt, content, document_id=None, source=None) -> Regulation:
+  # Tokens, wall time, retries and cost of every call are recorded for the run's AgentLog
+  # 429s slow every extraction down instead of each call retrying on its own, repeated failures stop them for a while
+  with upstreams["llm"].guard():
+    completion = parse_with_usage(
+      llm,
+      document_id=document_id,
+      source=source,
+      model=LLM_MODEL,
+      messages=[
+        {"role": "system", "content": prompt},
+        {"role": "user", "content": content}
+      ],
+      response_format=Regulation
+    )
+
+  return completion.choices[0].message.parsed
+
+def estimate_tokens(text):
+  # Roughly four characters per token for English text
+  return len(text) // 4 + 1
+
+def split_text(text, max_tokens):
+  """Splits document text into chunks of at most max_tokens, breaking on page markers first,
+  then on blank lines between sections, and only cutting mid-paragraph as a last resort."""
+  max_chars = max_tokens * 4
+  pieces = []
+  for page in re.split(r'(?=\n--- Page \d+ ---\n)', text):
+    if len(page) <= max_chars:
+      pieces.append(page)
+      continue
+    # The blank lines are captured and kept at the end of their section, so no text is lost or glued together
+    parts = re.split(r'(\n\s*\n)', page)
+    for section in (parts[n] + (parts[n + 1] if n + 1 < len(parts) else "") for n in range(0, len(parts), 2)):
+      pieces.extend(section[i:i + max_chars] for i in range(0, len(section), max_chars))
+
+  chunks = []
+  current = ""
+  for piece in pieces:
+    if current and len(current) + len(piece) > max_chars:
+      chunks.append(current)
+      current = ""
+    current += piece
+  if current.strip():
+    chunks.append(current)
+  return chunks
+
+def merge_regulations(parts: list[Regulation]) -> Regulation:
+  # Document level fields come from the first chunk that has them, usually the cover page
+  fields = {}
+  for name in ("title", "reference", "description", "release_date", "effective_date", "last_ammend_date"):
+    fields[name] = next((getattr(part, name) for part in parts if getattr(part, name)), getattr(parts[0], name))
+
+  # Sections repeated across chunk boundaries are merged, keeping the most detailed description
+  sections = {}
+  for part in parts:
+    for section in part.sections:
+      key = re.sub(r'\W+', ' ', section.title.lower()).strip()
+      if key not in sections or len(section.description) > len(sections[key].description):
+        sections[key] = section
+  fields["sections"] = list(sections.values())
+  return parts[0].model_copy(update=fields)
+
+def download_document(source, entry):
+    linkHref = source.document_url(entry)
+
+    # Save the PDF to a file, unless the copy from an earlier run is still intact
+    pdf_path, pdf_url = source.document_path(entry)
+    pdf_hash = downloads_cache.get(linkHref)
+    if pdf_hash is None or not os.path.exists(pdf_path) or sha256_file(pdf_path) != pdf_hash:
+        os.makedirs(os.path.dirname(pdf_path), exist_ok=True)
+        with source.upstream.guard():
+            pdf_hash = download_file(linkHref, pdf_path)
+        downloads_cache.set(linkHref, pdf_hash)
+    return pdf_path, pdf_url, linkHref, pdf_hash
+
+def ocr_document(pdf_path):
+    # Born-digital pages come straight from the text layer, the rest are OCR'd across the process pool
+    text, stats = extract_pdf_text(pdf_path)
+    logger.info("%s: %s of %s pages read from the text layer, %s OCR'd", pdf_path, stats['text_layer'], stats['pages'], stats['ocr'],
+                extra={"pages": stats['pages'], "text_layer_pages": stats['text_layer'], "ocr_pages": stats['ocr']})
+    return text
+
+def build_payload(regulation, linkHref):
+    # Prepare the payload for the API request
+    return {
+        "title": regulation.title,
+        "reference": regulation.reference,
+        #"link": BASE_URL + regulation.link,
+        "link": linkHref,
+        "type": regulation.type,
+        "description": regulation.description,
+        "releaseDate": format_date_as_string(regulation.release_date),  # Format release_date as yyyy-mm-dd
+        "effectiveDate": format_date_as_string(regulation.effective_date or regulation.release_date),
+        "lastAmmendDate": format_date_as_string(regulation.last_ammend_date or regulation.release_date),
+        "regulatoryStatus": regulation.regulatory_status,
+        "aiRegulationSectionDtos": [
+        {
+        "aiRegulationDraftId": 0,
+        "title": section.title,
+        "description": section.description,
+        "actionPlan": section.action_plan,
+        "sanctions": section.sanctions,
+        "requiresRegulatoryReturns": str(section.requires_regulatory_returns),
+        "frequencyOfReturns": section.frequency_of_returns or "NA",
+        "units": ','.join(section.units),
+        "timelineDate": format_date_as_string(section.timeline_date or regulation.release_date)
+        } for section in regulation.sections
+        ]
+    }
+
+def save_decomposition(circular, regulation, linkHref):
+    """Stores the extracted regulation as the document's AgentDecomposition, the checkpoint of the LLM stage."""
+    with Session(get_engine()) as db:
+        # A worker that died after saving but before checkpointing left the row behind, it is reused
+        decomposition = db.exec(select(AgentDecomposition).where(
+            AgentDecomposition.source == circular.source, AgentDecomposition.document_id == circular.id)).first()
+        if decomposition is None:
+            decomposition = AgentDecomposition(source=circular.source, document_id=circular.id)
+        decomposition.document_url = linkHref
+        decomposition.date = circular.date
+        decomposition.decomposition = regulation.model_dump_json()
+        db.add(decomposition)
+        db.commit()
+        db.refresh(decomposition)
+    index_decomposition(decomposition)
+    return decomposition.id
+
+def load_decomposition(decomposition_id):
+    with Session(get_engine()) as db:
+        decomposition = db.get(AgentDecomposition, decomposition_id)
+    return Regulation.model_validate_json(decomposition.decomposition)
+
+def process_document(source, job):
+    """Runs the stages of a queued document, skipping the ones already checkpointed by an earlier attempt."""
+    entry = job["data"]
+    checkpoints = job["checkpoints"]  # Updated in place by every checkpoint
+
+    # Each stage only runs while holding one of its slots, so every stage has its own worker limit.
+    # The PDF is only needed again if the OCR stage has not completed yet.
+    if "download" not in checkpoints or ("ocr" not in checkpoints and not os.path.exists(checkpoints["download"]["pdf_path"])):
+        with pipeline_stage(source, job, "download"):
+            pdf_path, pdf_url, linkHref, pdf_hash = download_document(source, entry)
+        source.queue.checkpoint(job, "download", {"pdf_path": pdf_path, "pdf_url": pdf_url, "linkHref": linkHref, "pdf_hash": pdf_hash})
+    download = checkpoints["download"]
+
+    if "ocr" not in checkpoints:
+        # The same PDF bytes always produce the same text, so OCR only runs once per document
+        text = get_text(download["pdf_hash"])
+        if text is None:
+            with pipeline_stage(source, job, "ocr"):
+                text = ocr_document(download["pdf_path"])
+            set_text(download["pdf_hash"], text)
+        source.queue.checkpoint(job, "ocr", text)
+
+    description = source.describe(entry)
+    circular = Circular()
+    circular.id = source.entry_id(entry)
+    circular.source = source.name
+    circular.regulator = source.regulator
+    circular.reference = description["reference"]
+    circular.link = download["pdf_url"]
+    circular.description = description["description"]
+    circular.date = description["date"]
+    circular.content = checkpoints["ocr"]
+
+    if "llm" not in checkpoints:
+        with pipeline_stage(source, job, "llm"):
+            regulation: Regulation = extract_rules(circular)
+        source.queue.checkpoint(job, "llm", save_decomposition(circular, regulation, download["linkHref"]))
+    else:
+        regulation = load_decomposition(checkpoints["llm"])
+
+    payload = build_payload(regulation, download["linkHref"])
+    # The whole payload is only formatted when debug logging is on
+    logger.debug("Regulation payload: %s", payload)
+
+    # Sent by the upload queue, a rejected payload no longer holds up the documents behind it
+    enqueue_upload(source.name, circular.id, download["pdf_hash"], payload)
+
+def drain_queue(source):
+    """Processes the source's queued documents until none can be leased, returns the first error met or None.
+
+    Failed documents go back to the queue with their checkpoints and are retried after a delay,
+    any number of processes can drain the same queue at once.
+    """
+    errors = []
+
+    def work():
+        owner = worker_id()
+        while True:
+            job = source.queue.lease(owner)
+            if job is None:
+                return
+            try:
+                process_document(source, job)
+            except LeaseLost as e:
+                logger.warning("%s", e)  # Another worker is running it now
+                continue
+            except CircuitOpen as e:
+                # An outage must not use up the attempts, the document waits until the circuit lets calls through
+                logger.warning("%s document %s put back: %s", source.name, job["id"], e)
+                errors.append(e)
+                source.queue.release(job, e.retry_after, e)
+                continue
+            except Exception as e:
+                logger.exception("%s document %s failed on attempt %s", source.name, job["id"], job["attempts"])
+                metrics.scraper_documents.inc(source=source.name, outcome="failed")
+                errors.append(e)
+                source.queue.fail(job, e)
+                continue
+            # Seen before complete, a crash in between only queues this one upload again under the same key
+            source.mark_seen(job["id"])
+            source.queue.complete(job)
+            metrics.scraper_documents.inc(source=source.name, outcome="processed")
+
+    # Enough workers for every stage to be busy at the same time
+    with ThreadPoolExecutor(max_workers=sum(PIPELINE_WORKERS.values())) as executor:
+        for _ in range(sum(PIPELINE_WORKERS.values())):
+            executor.submit(work)
+    return errors[0] if errors else None
+
+def update_cursor(source):
+    # The cursor is the newest document with nothing unprocessed published before it
+    listing = source.run_cache.get("listing")
+    last_run_id = source.get_cursor()
+    for entry in reversed(listing["entries"] if listing else []):
+        if not source.is_seen(source.entry_id(entry)):
+            break
+        last_run_id = source.entry_id(entry)
+    source.set_cursor(last_run_id)
+    set_backlog(source)
+
+def do_main(source):
+    #token = get_token()  # Should return "Thisistokenstr"
+    #if token == None:
+    #    request_auth()
+    #    token = get_token()
+    # Find all document entries
+    all_entries = source.fetch_listing()
+    if not all_entries:
+        raise ValueError(f"No {source.name} documents found")
+
+    last_run_id = source.get_cursor()
+    if not source.has_seen_any():
+        # Seed the seen ids from the cursor, everything from the cursor down is already processed
+        ids = [source.entry_id(entry) for entry in all_entries]
+        start = ids.index(last_run_id) if last_run_id in ids else 0
+        for id in ids[start:]:
+            source.mark_seen(id)
+        if last_run_id not in ids:
+            source.set_cursor(ids[0])
+            raise NothingToProcess("System is running for the first time, next available document will be processed")
+
+    # Oldest first, i.e. publication order. Documents still queued from an earlier run keep their place.
+    for entry in reversed(all_entries):
+        if not source.is_seen(source.entry_id(entry)):
+            source.queue.enqueue(source.entry_id(entry), entry)
+    set_backlog(source)
+
+    if not pipeline_status[source.name]:
+        raise_if_failed(source)
+        raise NothingToProcess(f"No new {source.name} documents found")
+
+    error = drain_queue(source)
+    update_cursor(source)
+
+    logger.info("Content cache: %s", cache_stats())
+    if error is not None:
+        raise error
+    raise_if_failed(source)
+
+def raise_if_failed(source):
+    failed = source.queue.failed()
+    if failed:
+        ids = ", ".join(str(job["id"]) for job in failed)
+        raise DocumentsFailed(f"{source.name} documents {ids} failed after every attempt and wait for a retry, last error: {failed[-1]['error']}")
+
+def work_forever(poll_interval=JOB_POLL_INTERVAL):
+    """Extra worker process draining the queues filled by the scheduled runs."""
+    load_sources()
+    while True:
+        for source in sources.values():
+            work_pass(source)
+        flush_uploads()
+        time.sleep(poll_interval)
+
+def work_pass(source):
+    # Logged as a run of its own, which also saves the LLM usage of the extractions made here
+    if not source.queue.pending():
+        return
+    agent_log_id = start_agent_log(source.name)
+    try:
+        error = drain_queue(source)
+        update_cursor(source)
+    except Exception as e:
+        finish_agent_log(agent_log_id, source.name, "FAILED", str(e), source.get_cursor())
+        raise
+    finish_agent_log(agent_log_id, source.name, "FAILED" if error else "SUCCESS",
+                     str(error) if error else None, source.get_cursor())
+
+def format_date_as_string(date):
+    if isinstance(date, datetime):
+        return date.strftime("%Y-%m-%d")
+    elif isinstance(date, str):
+        try:
+            # Try parsing as yyyy-mm-dd
+            parsed_date = datetime.strptime(date, "%Y-%m-%d")
+            return parsed_date.strftime("%Y-%m-%d")
+        except ValueError:
+            try:
+                # Try parsing as dd/mm/yyyy
+                parsed_date = datetime.strptime(date, "%d/%m/%Y")
+                return parsed_date.strftime("%Y-%m-%d")
+            except ValueError:
+                return date  # Return the original string if parsing fails
+    else:
+        return date  # Return the original value if it's neither a string nor a datetime
+def log_agent_request(source, status=None, error=None):
+    try:
+        #token = get_token()  # Should return "Thisistokenstr"
+        #if token == None:
+        #    request_auth()
+        #    token = get_token()
+
+        # Send the API request
+        with upstreams["rulebook"].guard() as call:
+            response = session.post(
+                RULEBOOK_API_AI_LOG_URL,
+                headers={
+                'accept': 'text/plain',
+                #'Authorization': f'Bearer {token}',
+                'x-api-key': RULEBOOK_API_KEY,
+                'Content-Type': 'application/json'
+                },
+                json={
+                "lastRunTime": datetime.now(timezone.utc).isoformat(sep='T', timespec='seconds'),
+                "runStatus": status,
+                "regulationSite": source.site_name,
+                "errorMessage": (error if error else ""),
+                }
+            )
+            call.record(response)
+
+        response.raise_for_status()  # Ensure the request was successful
+        result = response.json()
+        logger.debug("Agent log response: %s", result)
+    except (requests.exceptions.RequestException, CircuitOpen) as e:
+        logger.error("An error occurred while logging the agent request: %s", e)
+        if error:
+            logger.error("Additional error information: %s", error)
+def request_auth():
+    response = session.post(
+        RULEBOOK_API_AUTH_URL,
+        headers={
+            'accept': '*/*',
+            'Content-Type': 'application/json'
+        },
+        json={
+            "username": RULEBOOK_API_AUTH_USERNAME,
+            "password": RULEBOOK_API_AUTH_PASSWORD,
+            "otp": RULEBOOK_API_AUTH_OTP
+        }
+    )
+
+    response.raise_for_status()  # Ensure the request was successful
+    result = response.json()["result"]
+    set_auth({"expires": result["expiration"], "token": result["token"]})
+
+def run_cycle(source):
+    log_agent_request(source, 0)
+    agent_log_id = start_agent_log(source.name)
+    try:
+        do_main(source)
+        log_agent_request(source, 1)
+        finish_agent_log(agent_log_id, source.name, "SUCCESS", last_document_id=source.get_cursor())
+    except Exception as e:  
+        log_agent_request(source, 2, str(e))
+        finish_agent_log(agent_log_id, source.name, "IDLE" if isinstance(e, NothingToProcess) else "FAILED", str(e), source.get_cursor())
+        if isinstance(e, NothingToProcess):
+            logger.info("%s", e)
+            return  # Not a failure, the scheduler just waits for the next regular cycle
+        if isinstance(e, DocumentsFailed):
+            # Needs a person, backing the scheduler off would only delay the documents published after them
+            logger.error("%s", e)
+            return
+        logger.exception("%s run failed: %s", source.name, e)
+        if isinstance(e, requests.exceptions.HTTPError) and 400 <= e.response.status_code < 500:
+            logger.error("Client Error: %s %s", e.response.status_code, e.response.text)
+        raise
+    finally:
+        logger.info("%s cursor: %s", source.name, source.get_cursor())
+
+def run_all():
+    """One cycle of every registered source, run side by side, then the queued uploads. Raises the first failure."""
+    with ThreadPoolExecutor(max_workers=max(1, len(sources))) as executor:
+        futures = [executor.submit(run_cycle, source) for source in sources.values()]
+    # Also sends the retries of uploads queued by earlier cycles
+    flush_uploads()
+    errors = [future.exception() for future in futures if future.exception() is not None]
+    if errors:
+        raise errors[0]
+
+def create_scheduler():
+    load_sources()
+    return Scheduler("scrapers", run_all, queue_depth=lambda: sum(pipeline_status.values()) + upload_queue.pending())
+
+if __name__ == '__main__':
+    from app.log import setup_logging
+    setup_logging()
+    if sys.argv[1:] == ["worker"]:
+        work_forever()
+    else:
+        asyncio.run(create_scheduler().run_forever())
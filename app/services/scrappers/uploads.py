@@ -0,0 +1,133 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+
+from diskcache import Cache
+
+from app import metrics
+from app.services.http_client import apost
+from app.services.job_queue import JobQueue, LeaseLost, worker_id
+from app.services.lazy import Lazy
+from app.services.upstreams import CircuitOpen, upstreams
+
+logger = logging.getLogger(__name__)
+
+RULEBOOK_API_INVENTORY_URL = os.getenv("RULEBOOK_API_INVENTORY_URL")
+# Set when the Rulebook API accepts a JSON list of drafts in one request, uploads are sent one by one otherwise.
+# Each draft in the list carries its own idempotencyKey, the one that would be sent alone as the Idempotency-Key header.
+RULEBOOK_API_INVENTORY_BATCH_URL = os.getenv("RULEBOOK_API_INVENTORY_BATCH_URL")
+RULEBOOK_API_KEY = os.getenv("RULEBOOK_API_KEY")
+
+# Requests in flight at once and drafts per request when batching
+RULEBOOK_UPLOAD_CONCURRENCY = int(os.getenv("RULEBOOK_UPLOAD_CONCURRENCY", 4))
+RULEBOOK_UPLOAD_BATCH_SIZE = int(os.getenv("RULEBOOK_UPLOAD_BATCH_SIZE", 20))
+
+# Regulations waiting to be sent to the Rulebook API. Payloads that can never be accepted stay here
+# as failed jobs (the dead letters) until they are inspected and retried or removed.
+upload_queue = JobQueue("rulebook_uploads")
+# Keys of the uploads the API accepted, so a document is not sent again even if the server ignores the key
+completed_keys = Lazy(lambda: Cache("./.cache/uploads_done"))
+
+class PermanentUploadError(Exception):
+    """The Rulebook API rejected the payload, sending it again would fail the same way."""
+
+def idempotency_key(source_name, document_hash):
+    # The same document always gets the same key, so a retried upload never creates a second draft
+    return hashlib.sha256(f"{source_name}:{document_hash}".encode()).hexdigest()
+
+def enqueue_upload(source_name, document_id, document_hash, payload):
+    key = idempotency_key(source_name, document_hash)
+    if key in completed_keys:
+        logger.info("Regulation %s of %s was already uploaded, skipping.", document_id, source_name)
+        return key
+    upload_queue.enqueue(key, {"source": source_name, "document_id": document_id, "payload": payload})
+    return key
+
+async def post(url, key, body):
+    async with upstreams["rulebook"].aguard() as call:
+        response = await apost(
+            url,
+            headers={
+            'accept': 'text/plain',
+            'x-api-key': RULEBOOK_API_KEY,
+            'Content-Type': 'application/json',
+            'Idempotency-Key': key,
+            },
+            json=body
+        )
+        call.record(response)
+    # Client errors other than timeouts and throttling will not go away on a retry
+    if 400 <= response.status_code < 500 and response.status_code not in (408, 409, 429):
+        raise PermanentUploadError(f"Rulebook API returned {response.status_code}: {response.text[:500]}")
+    response.raise_for_status()
+    result = response.json()
+    logger.debug("Upload response: %s", result)
+    if result.get("isSuccess") != True:
+        raise PermanentUploadError(f"Rulebook API did not accept the regulation: {result}")
+
+async def send(jobs, slots):
+    async with slots:
+        start = time.perf_counter()
+        try:
+            if len(jobs) == 1:
+                await post(RULEBOOK_API_INVENTORY_URL, jobs[0]["id"], jobs[0]["data"]["payload"])
+            else:
+                # A retried batch is usually grouped differently, the per-draft keys are what keep it from creating duplicates
+                batch_key = hashlib.sha256("".join(sorted(job["id"] for job in jobs)).encode()).hexdigest()
+                await post(RULEBOOK_API_INVENTORY_BATCH_URL, batch_key,
+                           [{**job["data"]["payload"], "idempotencyKey": job["id"]} for job in jobs])
+            error = None
+        except Exception as e:
+            error = e
+        elapsed = time.perf_counter() - start
+
+    if isinstance(error, PermanentUploadError) and len(jobs) > 1:
+        # One rejected draft must not dead-letter the valid ones sent with it, each is tried on its own
+        logger.warning("Batch of %s uploads rejected, sending them one by one: %s", len(jobs), error)
+        await asyncio.gather(*(send([job], slots) for job in jobs))
+        return
+
+    for job in jobs:
+        source = job["data"]["source"]
+        metrics.scraper_stage_duration.observe(elapsed / len(jobs), source=source, stage="upload")
+        try:
+            if error is None:
+                completed_keys.set(job["id"], True)
+                upload_queue.complete(job)
+                metrics.scraper_documents.inc(source=source, outcome="uploaded")
+                logger.info("Regulation %s of %s successfully uploaded.", job["data"]["document_id"], source)
+            elif isinstance(error, CircuitOpen):
+                # Never sent, the attempt does not count
+                upload_queue.release(job, error.retry_after, error)
+                logger.warning("Upload of %s document %s put back: %s", source, job["data"]["document_id"], error)
+            elif isinstance(error, PermanentUploadError):
+                upload_queue.dead_letter(job, error)
+                metrics.scraper_documents.inc(source=source, outcome="dead_lettered")
+                logger.error("Upload of %s document %s dead-lettered: %s", source, job["data"]["document_id"], error)
+            else:
+                upload_queue.fail(job, error)
+                logger.warning("Upload of %s document %s failed, will retry: %s", source, job["data"]["document_id"], error)
+        except LeaseLost as e:
+            logger.warning("%s", e)
+
+async def flush_uploads_async():
+    slots = asyncio.Semaphore(RULEBOOK_UPLOAD_CONCURRENCY)
+    batch_size = RULEBOOK_UPLOAD_BATCH_SIZE if RULEBOOK_API_INVENTORY_BATCH_URL else 1
+    owner = worker_id()
+    while True:
+        # Enough uploads to keep every slot busy, failed ones wait for their retry delay and are not leased again here
+        jobs = []
+        while len(jobs) < batch_size * RULEBOOK_UPLOAD_CONCURRENCY:
+            job = upload_queue.lease(owner)
+            if job is None:
+                break
+            jobs.append(job)
+        if not jobs:
+            return
+        await asyncio.gather(*(send(jobs[i:i + batch_size], slots) for i in range(0, len(jobs), batch_size)))
+
+def flush_uploads():
+    """Sends every queued upload that is due, from a thread without a running event loop."""
+    asyncio.run(flush_uploads_async())
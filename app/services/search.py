@@ -0,0 +1,220 @@
+import bisect
+import heapq
+import json
+import math
+import re
+import threading
+import time
+from collections import Counter
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+# Weight of a query term that only matched an indexed term as a prefix, and the shortest query term
+# expanded as a prefix (a single letter would match a large part of the vocabulary)
+PREFIX_WEIGHT = 0.5
+MIN_PREFIX_LENGTH = 2
+
+def tokenize(text):
+    return re.findall(r"\w+", (text or "").lower())
+
+def decomposition_text(decomposition):
+    """Flattens a stored decomposition into plain text, keeping only the values of JSON documents."""
+    try:
+        data = json.loads(decomposition or "")
+    except ValueError:
+        return decomposition or ""
+    values = []
+    def walk(value):
+        if isinstance(value, dict):
+            for item in value.values():
+                walk(item)
+        elif isinstance(value, list):
+            for item in value:
+                walk(item)
+        elif value is not None:
+            values.append(str(value))
+    walk(data)
+    return " ".join(values)
+
+class InvertedIndex:
+    """In-process inverted index with BM25 ranking and prefix matching on query terms."""
+
+    def __init__(self):
+        self.postings = {}  # term -> {doc_id: term frequency}
+        self.documents = {}  # doc_id -> (payload, terms, length)
+        self.terms = []  # Sorted terms for prefix lookups
+        self.total_length = 0
+        self.built_at = None
+        self.lock = threading.RLock()
+        # Writes made while a rebuild reads its rows, replayed on the new contents, None when not rebuilding
+        self.journal = None
+        self.invalidated = False
+
+    def add(self, doc_id, text, payload):
+        with self.lock:
+            if self.journal is not None:
+                self.journal.append((doc_id, text, payload))
+            self.discard(doc_id)
+            terms = tokenize(text)
+            frequencies = Counter(terms)
+            for term, frequency in frequencies.items():
+                if term not in self.postings:
+                    self.postings[term] = {}
+                    bisect.insort(self.terms, term)
+                self.postings[term][doc_id] = frequency
+            self.documents[doc_id] = (payload, frequencies, len(terms))
+            self.total_length += len(terms)
+
+    def remove(self, doc_id):
+        with self.lock:
+            if self.journal is not None:
+                self.journal.append((doc_id, None, None))
+            self.discard(doc_id)
+
+    def discard(self, doc_id):
+        with self.lock:
+            document = self.documents.pop(doc_id, None)
+            if document is None:
+                return
+            _, frequencies, length = document
+            self.total_length -= length
+            for term in frequencies:
+                postings = self.postings[term]
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self.postings[term]
+                    del self.terms[bisect.bisect_left(self.terms, term)]
+
+    def begin_rebuild(self):
+        """Call before reading the rows for rebuild(), writes made from now on are applied again on
+        top of them."""
+        with self.lock:
+            self.journal = []
+            self.invalidated = False
+
+    def cancel_rebuild(self):
+        with self.lock:
+            self.journal = None
+
+    def rebuild(self, documents):
+        """Replaces the contents with (doc_id, text, payload) documents, searches keep using the old
+        contents until the new ones are ready."""
+        postings = {}
+        indexed = {}
+        total_length = 0
+        for doc_id, text, payload in documents:
+            terms = tokenize(text)
+            frequencies = Counter(terms)
+            for term, frequency in frequencies.items():
+                postings.setdefault(term, {})[doc_id] = frequency
+            indexed[doc_id] = (payload, frequencies, len(terms))
+            total_length += len(terms)
+        terms = sorted(postings)
+        with self.lock:
+            self.postings = postings
+            self.documents = indexed
+            self.terms = terms
+            self.total_length = total_length
+            journal, self.journal = self.journal or [], None
+            # The rows may have been read before these writes were committed
+            for doc_id, text, payload in journal:
+                if text is None:
+                    self.discard(doc_id)
+                else:
+                    self.add(doc_id, text, payload)
+            # Invalidated while the rows were read, they may already be out of date
+            self.built_at = None if self.invalidated else time.monotonic()
+
+    def matching_terms(self, query_term):
+        # The exact term plus every indexed term it is a prefix of
+        if len(query_term) < MIN_PREFIX_LENGTH:
+            if query_term in self.postings:
+                yield query_term, 1.0
+            return
+        for position in range(bisect.bisect_left(self.terms, query_term), len(self.terms)):
+            term = self.terms[position]
+            if not term.startswith(query_term):
+                break
+            yield term, 1.0 if term == query_term else PREFIX_WEIGHT
+
+    def search(self, query, limit=20):
+        """Returns [(score, payload)] for documents matching every query term, best first."""
+        query_terms = tokenize(query)
+        if not query_terms:
+            return []
+        with self.lock:
+            count = len(self.documents)
+            if not count:
+                return []
+            average_length = self.total_length / count
+            documents = self.documents
+
+            # Start from the query term with the fewest matches, later terms only score those candidates
+            expansions = [list(self.matching_terms(query_term)) for query_term in query_terms]
+            expansions.sort(key=lambda terms: sum(len(self.postings[term]) for term, _ in terms))
+
+            scores = None
+            for terms in expansions:
+                term_scores = {}
+                for term, weight in terms:
+                    postings = self.postings[term]
+                    idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                    term_weight = weight * idf * (K1 + 1)
+                    candidates = postings.items() if scores is None else ((doc_id, postings[doc_id]) for doc_id in scores if doc_id in postings)
+                    for doc_id, frequency in candidates:
+                        score = term_weight * frequency / (frequency + K1 * (1 - B + B * documents[doc_id][2] / average_length))
+                        if score > term_scores.get(doc_id, 0.0):
+                            term_scores[doc_id] = score
+                if scores is None:
+                    scores = term_scores
+                else:
+                    # Every query term has to match
+                    scores = {doc_id: scores[doc_id] + score for doc_id, score in term_scores.items()}
+                if not scores:
+                    return []
+
+            best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+            return [(round(score, 4), self.documents[doc_id][0]) for doc_id, score in best]
+
+    def is_stale(self, ttl):
+        return self.built_at is None or time.monotonic() - self.built_at > ttl
+
+    def is_tracking(self):
+        # Built, or being rebuilt and replaying writes once the rows are loaded
+        return self.built_at is not None or self.journal is not None
+
+    def invalidate(self):
+        with self.lock:
+            self.built_at = None
+            self.invalidated = self.journal is not None
+
+employee_index = InvertedIndex()
+regulation_index = InvertedIndex()
+
+def employee_document(employee):
+    return employee.id, f"{employee.name} {employee.position}", {"id": employee.id, "name": employee.name, "position": employee.position}
+
+def decomposition_document(decomposition):
+    text = decomposition_text(decomposition.decomposition)
+    return decomposition.id, text, {
+        "id": decomposition.id,
+        "document_id": decomposition.document_id,
+        "document_url": decomposition.document_url,
+        "date": decomposition.date,
+        "source": decomposition.source,
+        "snippet": text[:200],
+    }
+
+# Keep a built index in sync with inserts, updates and deletes, an index that is not built yet
+# loads everything from the database on the first search anyway
+def index_employee(employee):
+    if employee_index.is_tracking():
+        employee_index.add(*employee_document(employee))
+
+def unindex_employee(employee_id):
+    employee_index.remove(employee_id)
+
+def index_decomposition(decomposition):
+    if regulation_index.is_tracking():
+        regulation_index.add(*decomposition_document(decomposition))
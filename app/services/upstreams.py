@@ -0,0 +1,254 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from email.utils import parsedate_to_datetime
+
+import requests
+
+from app import metrics
+
+# Consecutive failures that open a circuit, and how long it stays open before a trial call is let through
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 5))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", 60))
+# Pause applied on a 429 that carries no Retry-After header
+DEFAULT_RETRY_AFTER = float(os.getenv("DEFAULT_RETRY_AFTER", 5))
+
+class CircuitOpen(Exception):
+    """Raised instead of calling an upstream that keeps failing, retry_after is the wait until a trial call is let through."""
+
+    def __init__(self, message, retry_after=0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """Token bucket whose rate adapts to the upstream: halved on every 429, then grown back 5% per
+    successful call up to the configured maximum, and paused for as long as Retry-After asks."""
+
+    def __init__(self, rate, burst):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = rate / 32
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """Takes a token and returns how many seconds the caller has to wait before using it."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            # A negative balance is a queue of callers, each waiting for its own token to refill
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.paused_until - now)
+
+    def throttled(self, retry_after):
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+
+    def succeeded(self):
+        if self.rate < self.max_rate:
+            with self.lock:
+                self.rate = min(self.max_rate, self.rate * 1.05)
+
+class CircuitBreaker:
+    def __init__(self, threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def retry_after(self):
+        """Seconds until the circuit lets a trial call through, at least a second while a trial call is in flight."""
+        if self.opened_at is None:
+            return 0.0
+        return max(1.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self):
+        with self.lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self.trial:
+                # A single trial call decides whether the circuit closes again
+                self.trial = True
+                return True
+            return False
+
+    def succeeded(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial = False
+
+    def failed(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self.trial = False
+
+    def undecided(self):
+        # The call told nothing about the upstream, let another one be the trial
+        with self.lock:
+            self.trial = False
+
+def retry_after_seconds(headers):
+    value = headers.get("Retry-After") if headers is not None else None
+    if not value:
+        return DEFAULT_RETRY_AFTER
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return DEFAULT_RETRY_AFTER
+
+def is_transport_error(error):
+    """Connection failures and timeouts, raised by the HTTP clients directly or wrapped by an SDK."""
+    transport = [requests.exceptions.ConnectionError, requests.exceptions.Timeout, requests.exceptions.RetryError,
+                 ConnectionError, TimeoutError]
+    # The OpenAI SDK wraps httpx errors, httpx is only looked at once something has imported it
+    httpx = sys.modules.get("httpx")
+    if httpx is not None:
+        transport.append(httpx.TransportError)
+    for _ in range(10):
+        if error is None:
+            return False
+        if isinstance(error, tuple(transport)):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+class Call:
+    """One guarded call, record(response) reports how an HTTP response went."""
+
+    def __init__(self, upstream):
+        self.upstream = upstream
+        self.recorded = False
+
+    def record(self, response):
+        self.upstream.record(response.status_code, response.headers)
+        self.recorded = True
+
+class Upstream:
+    """Rate limit and circuit breaker in front of one external dependency."""
+
+    def __init__(self, name, rate, burst=None):
+        self.name = name
+        rate = float(os.getenv(f"{name.upper()}_RATE_LIMIT", rate))
+        burst = float(os.getenv(f"{name.upper()}_BURST", burst or max(1.0, rate)))
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker()
+
+    def before_call(self):
+        if not self.breaker.allow():
+            metrics.upstream_calls.inc(upstream=self.name, outcome="short_circuited")
+            retry_after = self.breaker.retry_after()
+            raise CircuitOpen(f"{self.name} is failing, calls are paused for {retry_after:.0f}s", retry_after)
+        return self.bucket.reserve()
+
+    def record(self, status_code=None, headers=None, error=None):
+        """Feeds the outcome of a call back: 429s slow the bucket down, 5xx and connection errors count against the circuit."""
+        if status_code == 429:
+            self.bucket.throttled(retry_after_seconds(headers))
+            # The upstream is alive, just busy
+            self.breaker.succeeded()
+            outcome = "throttled"
+        elif error is not None or (status_code is not None and status_code >= 500):
+            self.breaker.failed()
+            outcome = "failed"
+        else:
+            self.bucket.succeeded()
+            self.breaker.succeeded()
+            outcome = "ok"
+        metrics.upstream_calls.inc(upstream=self.name, outcome=outcome)
+
+    def record_exception(self, error):
+        # HTTP errors carry the response, requests and OpenAI alike
+        response = getattr(error, "response", None)
+        if response is not None and getattr(response, "status_code", None) is not None:
+            self.record(response.status_code, response.headers)
+        elif is_transport_error(error):
+            self.record(error=error)
+        else:
+            # Oversized downloads, truncated or invalid LLM output and the like say nothing about the upstream's health
+            self.breaker.undecided()
+            metrics.upstream_calls.inc(upstream=self.name, outcome="error")
+
+    def finish(self, call, error=None):
+        # Calls that did not report a response are judged by whether they raised
+        if call.recorded:
+            return
+        if error is None:
+            self.record()
+        else:
+            self.record_exception(error)
+
+    @contextmanager
+    def guard(self):
+        """Waits for a token, or raises CircuitOpen, then records the outcome of the block."""
+        time.sleep(self.before_call())
+        call = Call(self)
+        try:
+            yield call
+        except Exception as e:
+            self.finish(call, e)
+            raise
+        self.finish(call)
+
+    @asynccontextmanager
+    async def aguard(self):
+        await asyncio.sleep(self.before_call())
+        call = Call(self)
+        try:
+            yield call
+        except Exception as e:
+            self.finish(call, e)
+            raise
+        self.finish(call)
+
+    def status(self):
+        return {
+            "rate": round(self.bucket.rate, 3),
+            "max_rate": self.bucket.max_rate,
+            "paused_for": round(max(0.0, self.bucket.paused_until - time.monotonic()), 1),
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+        }
+
+# Requests per second allowed to each dependency
+upstreams = {
+    "llm": Upstream("llm", rate=5),
+    "cbn": Upstream("cbn", rate=2),
+    "rulebook": Upstream("rulebook", rate=5),
+}
+
+def collect_upstream_metrics():
+    for name, upstream in upstreams.items():
+        metrics.upstream_rate.set(upstream.bucket.rate, upstream=name)
+        metrics.upstream_circuit_open.set(int(upstream.breaker.state != "closed"), upstream=name)
+
+metrics.collectors.append(collect_upstream_metrics)
+
+def get_upstream(name, rate=2):
+    """The upstream of a scraper source, created with the given default rate the first time."""
+    if name not in upstreams:
+        upstreams[name] = Upstream(name, rate)
+    return upstreams[name]
@@ -0,0 +1,105 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+
+from fastapi.staticfiles import StaticFiles
+from starlette.responses import FileResponse
+
+try:
+    import brotli
+except ImportError:  # Brotli variants are only built when the package is installed
+    brotli = None
+
+STATIC_DIR = "app/static"
+# Precompressed variants live outside the served directory
+COMPRESSED_DIR = "./.cache/static"
+# Downloaded documents change at runtime, they are served as they are
+EXCLUDED_DIRS = ("cbn",)
+EXCLUDED_EXTENSIONS = (".pdf",)
+COMPRESSIBLE_EXTENSIONS = (".css", ".js", ".map", ".svg", ".ico", ".json", ".txt")
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+manifest = {}  # original path -> fingerprinted path
+originals = {}  # fingerprinted path -> original path
+variants = {}  # original path -> {encoding: precompressed file}
+
+def fingerprint(path, digest):
+    base, extension = os.path.splitext(path)
+    return f"{base}.{digest[:12]}{extension}"
+
+def file_sha256(source):
+    digest = hashlib.sha256()
+    with open(source, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def compress(source, hashed_path):
+    compressors = {"gzip": (".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0))}
+    if brotli:
+        compressors["br"] = (".br", lambda data: brotli.compress(data, quality=11))
+
+    built = {}
+    for encoding, (suffix, compressor) in compressors.items():
+        # Named after the content hash, so unchanged files are not compressed again on every startup
+        target = os.path.join(COMPRESSED_DIR, hashed_path + suffix)
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(source, "rb") as file:
+                data = compressor(file.read())
+            with open(target + ".tmp", "wb") as file:
+                file.write(data)
+            os.replace(target + ".tmp", target)
+        built[encoding] = target
+    return built
+
+def build_assets():
+    """Fingerprints the static files and builds their gzip/brotli variants, run once at startup."""
+    manifest.clear()
+    originals.clear()
+    variants.clear()
+    for root, dirs, files in os.walk(STATIC_DIR):
+        relative_root = os.path.relpath(root, STATIC_DIR)
+        if relative_root.split(os.sep)[0] in EXCLUDED_DIRS:
+            dirs[:] = []
+            continue
+        for name in files:
+            if name.startswith(".") or name.endswith(EXCLUDED_EXTENSIONS):
+                continue
+            source = os.path.join(root, name)
+            path = os.path.normpath(os.path.join(relative_root, name)).replace(os.sep, "/")
+            manifest[path] = fingerprint(path, file_sha256(source))
+            originals[manifest[path]] = path
+            if name.endswith(COMPRESSIBLE_EXTENSIONS):
+                variants[path] = compress(source, manifest[path])
+
+def static_url(path):
+    # Falls back to the plain path until build_assets() has run
+    return "/static/" + manifest.get(path, path)
+
+class AssetStaticFiles(StaticFiles):
+    """Serves fingerprinted URLs with immutable caching and precompressed variants when accepted."""
+
+    async def get_response(self, path, scope):
+        path = path.replace(os.sep, "/")
+        original = originals.get(path)
+        if original is None:
+            return await super().get_response(path, scope)
+
+        accept_encoding = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+        accepted = {item.split(";")[0].strip() for item in accept_encoding.split(",")}
+        headers = {"Cache-Control": IMMUTABLE, "Vary": "Accept-Encoding"}
+        for encoding in ("br", "gzip"):
+            variant = variants.get(original, {}).get(encoding)
+            if variant and encoding in accepted:
+                media_type = mimetypes.guess_type(original)[0] or "application/octet-stream"
+                return FileResponse(variant, media_type=media_type, headers={**headers, "Content-Encoding": encoding})
+
+        response = await super().get_response(original, scope)
+        response.headers.update(headers)
+        return response
@@ -1,18 +1,49 @@
-from fastapi import FastAPI, Form, Request, status
-from fastapi.responses import HTMLResponse, FileResponse, RedirectResponse
+from fastapi import FastAPI, Form, Request, Depends, HTTPException, status
+from fastapi.responses import HTMLResponse, RedirectResponse, Response, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
 from starlette.middleware.sessions import SessionMiddleware
-from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 import uvicorn
-from passlib.context import CryptContext
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 import os
+import logging
+from contextlib import asynccontextmanager
 
-from app.modules import employees, users
+from app.modules import employees, users, search
+from app.database import get_async_db, pool_stats
+from app.passwords import password_pool_stats
+from app.models import AgentLLMUsage
+from app.services.llm_usage import summarize
+from app.services.scheduler import schedulers
+from app.services.scrappers.base import load_sources
+from app.services.scrappers.uploads import upload_queue
+from app.services.upstreams import upstreams
+from app.services import response_cache
+from app.static_assets import AssetStaticFiles, build_assets, static_url
+from app.log import setup_logging, request_logging, request_stats
+from app import metrics
 
-app = FastAPI()
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
+setup_logging()
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Fingerprint and precompress the static files before serving any page that links them
+    await run_in_threadpool(build_assets)
+    # The scrapers can run inside the web app instead of as a separate process
+    if os.getenv("SCHEDULER_ENABLED", "false").lower() == "true":
+        from app.services.scrappers import pipeline
+        pipeline.create_scheduler().start()
+    yield
+    for scheduler in schedulers.values():
+        await scheduler.stop()
+
+app = FastAPI(lifespan=lifespan)
+app.mount("/static", AssetStaticFiles(directory="app/static"), name="static")
 templates = Jinja2Templates(directory="app/templates")
+templates.env.globals["static_url"] = static_url
 
 # Configuration for JWT
 SECRET_KEY = os.getenv("SECRET_KEY", "your_secret_key_here")
@@ -22,31 +53,138 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 # Add session middleware
 app.add_middleware(SessionMiddleware, secret_key=SECRET_KEY)
+# Request id and latency of every request
+app.middleware("http")(request_logging)
 
-# Include routers for employees and users
+# Include routers for employees, users and search
 app.include_router(employees.router)
 app.include_router(users.router)
+app.include_router(search.router)
 
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
-    print('Request for index page received')
-    return templates.TemplateResponse('index.html', {"request": request})
+    logger.debug('Request for index page received')
+    cached = response_cache.cached_response(request)
+    if cached:
+        return cached
+    response = templates.TemplateResponse('index.html', {"request": request})
+    return response_cache.cache_response(request, response)
+
+# Read once, browsers ask for it on every page until they cache it
+with open('./app/static/favicon.ico', 'rb') as favicon_file:
+    FAVICON = favicon_file.read()
 
 @app.get('/favicon.ico')
 async def favicon():
-    file_name = 'favicon.ico'
-    file_path = './app/static/' + file_name
-    return FileResponse(path=file_path, headers={'mimetype': 'image/vnd.microsoft.icon'})
+    return Response(content=FAVICON, media_type='image/vnd.microsoft.icon', headers={'Cache-Control': 'public, max-age=86400'})
 
 @app.post('/hello', response_class=HTMLResponse)
 async def hello(request: Request, name: str = Form(...)):
     if name:
-        print('Request for hello page received with name=%s' % name)
+        logger.debug('Request for hello page received with name=%s', name)
         return templates.TemplateResponse('hello.html', {"request": request, 'name':name})
     else:
-        print('Request for hello page received with no name or blank name -- redirecting')
+        logger.debug('Request for hello page received with no name or blank name -- redirecting')
         return RedirectResponse(request.url_for("index"), status_code=status.HTTP_302_FOUND)
 
+# Request, database and scraper metrics in the Prometheus text format
+@app.get('/metrics', response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type='text/plain; version=0.0.4')
+
+# Token, cost and latency aggregates over the most recent LLM calls made by the scrapers
+@app.get('/metrics/llm')
+async def llm_metrics(request: Request, limit: int = 1000, db: AsyncSession = Depends(get_async_db)):
+    if "user" not in request.session:
+        return RedirectResponse("/login")
+    statement = select(AgentLLMUsage).order_by(AgentLLMUsage.Id.desc()).limit(min(limit, 10000))
+    rows = (await db.exec(statement)).all()
+    return {"calls": len(rows), "models": summarize(rows)}
+
+# Connection pool gauges, used to size the pool against the number of workers
+@app.get('/admin/db/pool')
+async def db_pool(request: Request):
+    if "user" not in request.session:
+        return RedirectResponse("/login")
+    return pool_stats()
+
+# Queue and hashing times of the password hashing pool
+@app.get('/admin/passwords/pool')
+async def password_pool(request: Request):
+    if "user" not in request.session:
+        return RedirectResponse("/login")
+    return password_pool_stats()
+
+# Request count and latency per route
+@app.get('/admin/requests')
+async def requests_stats(request: Request):
+    if "user" not in request.session:
+        return RedirectResponse("/login")
+    return request_stats()
+
+# Next run, last duration and queue depth of the scrapers scheduled in this process
+@app.get('/scheduler/status')
+async def scheduler_status(request: Request):
+    if "user" not in request.session:
+        return RedirectResponse("/login")
+    return {name: scheduler.status() for name, scheduler in schedulers.items()}
+
+# Current rate limit and circuit breaker state of each external dependency
+@app.get('/admin/upstreams')
+async def upstreams_status(request: Request):
+    if "user" not in request.session:
+        return RedirectResponse("/login")
+    return {name: upstream.status() for name, upstream in upstreams.items()}
+
+# Rulebook uploads still queued, and the dead letters the API rejected for good
+@app.get('/admin/uploads')
+async def uploads(request: Request):
+    if "user" not in request.session:
+        return RedirectResponse("/login")
+    dead_letters = await run_in_threadpool(upload_queue.failed)
+    return {
+        "queue": await run_in_threadpool(upload_queue.status),
+        "dead_letters": [
+            {"key": job["id"], "source": job["data"]["source"], "document_id": job["data"]["document_id"],
+             "attempts": job["attempts"], "error": job["error"], "payload": job["data"]["payload"]}
+            for job in dead_letters
+        ],
+    }
+
+@app.post('/admin/uploads/{key}/retry')
+async def retry_upload(request: Request, key: str):
+    if "user" not in request.session:
+        return RedirectResponse("/login", status_code=status.HTTP_302_FOUND)
+    if not await run_in_threadpool(upload_queue.retry, key):
+        raise HTTPException(status_code=404, detail="No queued upload with this key")
+    return {"retried": key}
+
+# Scraped documents that used up their attempts, they hold each source's cursor back until retried
+@app.get('/admin/scrapers/failed')
+async def failed_documents(request: Request):
+    if "user" not in request.session:
+        return RedirectResponse("/login")
+    failed = {}
+    for name, source in load_sources().items():
+        jobs = await run_in_threadpool(source.queue.failed)
+        failed[name] = [{"id": job["id"], "attempts": job["attempts"], "error": job["error"],
+                         "completed_stages": list(job["checkpoints"])} for job in jobs]
+    return failed
+
+@app.post('/admin/scrapers/{source_name}/documents/{document_id}/retry')
+async def retry_document(request: Request, source_name: str, document_id: str):
+    if "user" not in request.session:
+        return RedirectResponse("/login", status_code=status.HTTP_302_FOUND)
+    source = next((source for name, source in load_sources().items() if name.lower() == source_name.lower()), None)
+    if source is None:
+        raise HTTPException(status_code=404, detail="No scraper source with this name")
+    # Ids come from the listing and are not always strings
+    jobs = await run_in_threadpool(source.queue.failed)
+    job = next((job for job in jobs if str(job["id"]) == document_id), None)
+    if job is None or not await run_in_threadpool(source.queue.retry, job["id"]):
+        raise HTTPException(status_code=404, detail="No failed document with this id")
+    return {"retried": job["id"]}
+
 if __name__ == '__main__':
     uvicorn.run('main:app', host='0.0.0.0', port=8000)
 
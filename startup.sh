@@ -1 +1,3 @@
+# Creates new tables and indexes and upgrades older columns, see "Database schema" in README.md
+python -m app.database
 python -m uvicorn main:app --host 0.0.0.0
@@ -0,0 +1,34 @@
+import base64
+import json
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# A throwaway SQLite database stands in for SQL Server, set before app.database reads the environment
+DB_PATH = os.path.join(tempfile.mkdtemp(prefix="eyregtech-tests-"), "test.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{DB_PATH}"
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+# main.py mounts app/static and app/templates relative to the working directory
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+    import main
+    return TestClient(main.app)
+
+@pytest.fixture
+def logged_in_client(client):
+    """A client whose session cookie carries a user, as set by /login."""
+    import itsdangerous
+    import main
+    session = base64.b64encode(json.dumps({"user": "tester"}).encode())
+    client.cookies.set("session", itsdangerous.TimestampSigner(main.SECRET_KEY).sign(session).decode())
+    return client
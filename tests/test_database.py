@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlmodel import select
+
+import app.models  # Registers the tables on SQLModel.metadata
+from app.database import create_db_and_tables, drop_db_and_tables, get_async_db, get_async_engine, get_engine
+from app.models import Employee
+
+@pytest.fixture(autouse=True)
+def tables():
+    create_db_and_tables()
+    yield
+    # Pooled aiosqlite connections belong to the event loop that opened them
+    asyncio.run(get_async_engine().dispose())
+    drop_db_and_tables()
+
+def test_async_session_round_trip():
+    async def round_trip():
+        async for db in get_async_db():
+            db.add(Employee(name="Ada Lovelace", position="Analyst"))
+            await db.commit()
+        # A new session, so the row is read back from the database rather than the identity map
+        async for db in get_async_db():
+            employees = (await db.exec(select(Employee).where(Employee.name == "Ada Lovelace"))).all()
+            return [(employee.name, employee.position) for employee in employees]
+
+    assert asyncio.run(round_trip()) == [("Ada Lovelace", "Analyst")]
+
+def test_employee_added_through_the_router_is_listed(logged_in_client):
+    response = logged_in_client.post("/employees/add", data={"name": "Grace Hopper", "position": "Admiral"}, follow_redirects=False)
+    assert response.status_code == 302
+
+    response = logged_in_client.get("/employees")
+    assert response.status_code == 200
+    assert "Grace Hopper" in response.text
+
+def test_failed_statements_do_not_leave_timings_on_the_connection():
+    with get_engine().connect() as conn:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM missing_table"))
+        conn.execute(text("SELECT 1"))
+
+        assert conn.info["query_start"] == []
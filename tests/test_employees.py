@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+
+import app.models  # Registers the tables on SQLModel.metadata
+from app.database import create_db_and_tables, drop_db_and_tables, get_async_engine
+from app.modules import employees
+
+@pytest.fixture(autouse=True)
+def tables():
+    create_db_and_tables()
+    yield
+    asyncio.run(get_async_engine().dispose())
+    drop_db_and_tables()
+
+def upload(client, filename, content):
+    return client.post("/employees/import", files={"file": (filename, content.encode())})
+
+@pytest.mark.parametrize("filename, content", [
+    ("staff.jsonl", '["a"]\n'),
+    ("staff.jsonl", '1\n'),
+    ("staff.jsonl", '{"name": 5, "position": "x"}\n'),
+    ("staff.jsonl", '{"name": "a"\n'),
+    ("staff.csv", "first,last\nAda,Lovelace\n"),
+    ("staff.csv", "name,position\n" + "x" * 256 + ",Analyst\n"),
+])
+def test_malformed_upload_is_rejected(logged_in_client, filename, content):
+    response = upload(logged_in_client, filename, content)
+
+    assert response.status_code == 400
+    assert response.json()["detail"]["committed"] == 0
+
+def test_error_after_a_batch_reports_the_rows_already_saved(logged_in_client, monkeypatch):
+    monkeypatch.setattr(employees, "EMPLOYEES_IMPORT_BATCH_SIZE", 2)
+    content = "".join(f'{{"name": "n{i}", "position": "p"}}\n' for i in range(3)) + '["bad"]\n'
+
+    response = upload(logged_in_client, "staff.jsonl", content)
+
+    assert response.status_code == 400
+    assert response.json()["detail"]["committed"] == 2
+
+def test_valid_upload_is_imported(logged_in_client):
+    response = upload(logged_in_client, "staff.csv", "name,position\nAda,Analyst\n,Nobody\n")
+
+    assert response.status_code == 200
+    assert response.json() == {"imported": 1, "skipped": 1}
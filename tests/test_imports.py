@@ -0,0 +1,33 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT
+
+# Wall time allowed for a cold import, generous enough for a slow CI machine
+IMPORT_BUDGET_SECONDS = float(os.getenv("IMPORT_BUDGET_SECONDS", 3.0))
+# SDKs that must only be loaded by the code that uses them
+HEAVY_MODULES = ("openai", "google.cloud", "pytesseract", "pdf2image")
+
+def import_report(module):
+    # A fresh interpreter, modules already imported by the test run would hide the cost
+    code = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "print(json.dumps({'seconds': time.perf_counter() - start, 'modules': sorted(sys.modules)}))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=os.environ.copy(),
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+@pytest.mark.parametrize("module", ["main", "app.services.scrappers.cbn"])
+def test_import_is_fast_and_skips_heavy_sdks(module):
+    report = import_report(module)
+
+    loaded = [name for name in report["modules"] if any(name == heavy or name.startswith(heavy + ".") for heavy in HEAVY_MODULES)]
+    assert loaded == []
+    assert report["seconds"] < IMPORT_BUDGET_SECONDS
@@ -0,0 +1,90 @@
+import pytest
+
+from app.services import job_queue
+from app.services.job_queue import JobQueue, LeaseLost
+
+class Clock:
+    """Stands in for the time module, so delays and lease timeouts pass without sleeping."""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(job_queue, "time", clock)
+    return clock
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch, clock):
+    # The queue lives under ./.cache, opened on first use
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(job_queue, "JOB_RETRY_DELAY", 10.0)
+    monkeypatch.setattr(job_queue, "JOB_MAX_ATTEMPTS", 3)
+    return JobQueue("test")
+
+def test_failed_job_is_leased_again_only_after_its_delay(queue, clock):
+    queue.enqueue("a", {})
+    queue.fail(queue.lease("w1"), "boom")
+
+    clock.now += 9
+    assert queue.lease("w1") is None
+    clock.now += 1
+    job = queue.lease("w1")
+    assert job["attempts"] == 2
+
+    # The delay doubles after every further failure
+    queue.fail(job, "boom")
+    clock.now += 19
+    assert queue.lease("w1") is None
+    clock.now += 1
+    assert queue.lease("w1")["attempts"] == 3
+
+def test_job_is_failed_after_the_last_attempt_and_retried_by_hand(queue, clock):
+    queue.enqueue("a", {})
+    for attempt in range(3):
+        job = queue.lease("w1")
+        assert job["attempts"] == attempt + 1
+        queue.fail(job, "boom")
+        clock.now += 1000
+
+    assert queue.lease("w1") is None
+    assert [job["id"] for job in queue.failed()] == ["a"]
+    assert queue.status() == {"pending": 0, "leased": 0, "failed": 1}
+
+    assert queue.retry("a")
+    assert queue.lease("w1")["attempts"] == 1
+
+def test_release_does_not_use_up_an_attempt(queue, clock):
+    queue.enqueue("a", {})
+    queue.release(queue.lease("w1"), 30)
+
+    clock.now += 30
+    assert queue.lease("w1")["attempts"] == 1
+
+def test_expired_lease_is_taken_over_and_resumes_from_the_checkpoint(queue, clock):
+    queue.enqueue("a", {})
+    first = queue.lease("w1")
+    queue.checkpoint(first, "download", {"pdf_path": "a.pdf"})
+
+    clock.now += job_queue.JOB_LEASE_TIMEOUT - 1
+    assert queue.lease("w2") is None
+    clock.now += 1
+    second = queue.lease("w2")
+    assert second["checkpoints"] == {"download": {"pdf_path": "a.pdf"}}
+
+    # The first worker finds out before it saves anything
+    with pytest.raises(LeaseLost):
+        queue.renew(first)
+
+def test_renew_extends_the_lease(queue, clock):
+    queue.enqueue("a", {})
+    job = queue.lease("w1")
+
+    clock.now += job_queue.JOB_LEASE_TIMEOUT - 1
+    queue.renew(job)
+    clock.now += job_queue.JOB_LEASE_TIMEOUT - 1
+    assert queue.lease("w2") is None
@@ -0,0 +1,65 @@
+import re
+
+from app import metrics
+
+SAMPLE = re.compile(r'^(?P<name>[a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(?P<labels>.*)\})? (?P<value>\S+)$')
+LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+def parse(text):
+    """Reads the Prometheus text format into ({family: type}, [(name, labels, value)])."""
+    types = {}
+    samples = []
+    for line in text.splitlines():
+        if line.startswith("# TYPE "):
+            _, _, family, kind = line.split(" ")
+            types[family] = kind
+        elif line and not line.startswith("#"):
+            match = SAMPLE.match(line)
+            assert match, f"Not a valid sample line: {line!r}"
+            labels = dict(LABEL.findall(match["labels"] or ""))
+            samples.append((match["name"], labels, float(match["value"])))
+    return types, samples
+
+def family_of(name, types):
+    for suffix in ("_bucket", "_sum", "_count"):
+        if name.endswith(suffix) and types.get(name[:-len(suffix)]) == "histogram":
+            return name[:-len(suffix)]
+    return name
+
+def test_metrics_endpoint_serves_parseable_request_metrics(client):
+    assert client.get("/").status_code == 200
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    types, samples = parse(response.text)
+
+    # Every sample belongs to a declared family
+    assert all(family_of(name, types) in types for name, _, _ in samples)
+    requests = [value for name, labels, value in samples
+                if name == "http_requests_total" and labels == {"route": "/", "method": "GET", "status": "200"}]
+    assert requests and requests[0] >= 1
+
+    buckets = [(labels["le"], value) for name, labels, value in samples
+               if name == "http_request_duration_seconds_bucket" and labels["route"] == "/"]
+    count = next(value for name, labels, value in samples
+                 if name == "http_request_duration_seconds_count" and labels["route"] == "/")
+    counts = [value for _, value in buckets]
+    assert counts == sorted(counts)  # Buckets are cumulative
+    assert buckets[-1] == ("+Inf", count)
+
+def test_mounted_apps_are_labelled_with_their_mount_path(client):
+    assert client.get("/static/favicon.ico").status_code == 200
+
+    _, samples = parse(client.get("/metrics").text)
+    routes = {labels["route"] for name, labels, _ in samples if name == "http_requests_total"}
+    assert "/static" in routes
+    assert "/static/favicon.ico" not in routes
+
+def test_label_values_are_escaped():
+    counter = metrics.Counter("test_escaped_total", "Label escaping.", ("path",))
+    metrics.registry.remove(counter)  # Kept out of the /metrics output of the other tests
+    counter.inc(path='a "quoted"\\path\nnext')
+
+    _, samples = parse("\n".join(counter.render()))
+    assert samples == [("test_escaped_total", {"path": 'a \\"quoted\\"\\\\path\\nnext'}, 1.0)]
@@ -0,0 +1,41 @@
+from app.services.scrappers.pipeline import Regulation, Section, merge_regulations, split_text
+
+PAGES = "".join(
+    f"\n--- Page {page} ---\n" + "\n\n".join(f"Section {page}.{n}. " + "word " * 60 for n in range(5))
+    for page in range(1, 4)
+)
+
+def section(title, description):
+    return Section(title=title, description=description, action_plan="", sanctions="", requires_regulatory_returns=False,
+                   frequency_of_returns="", units=["COMPLIANCE"], timeline_date="")
+
+def regulation(sections, **fields):
+    values = dict(title="", reference="", link="", type="CIRCULARS", description="", release_date="", effective_date="",
+                  last_ammend_date="", regulatory_status="ACTIVE", sections=sections)
+    return Regulation(**{**values, **fields})
+
+def test_chunks_join_back_to_the_original_text():
+    for max_tokens in (50, 200, 500, 10_000):
+        chunks = split_text(PAGES, max_tokens)
+
+        assert "".join(chunks) == PAGES
+        assert all(len(chunk) <= max_tokens * 4 for chunk in chunks)
+
+def test_short_text_is_a_single_chunk():
+    assert split_text(PAGES, 10_000) == [PAGES]
+
+def test_pages_are_not_cut_when_they_fit():
+    chunks = split_text(PAGES, len(PAGES) // 4 // 2)
+
+    # Every chunk after the first starts on a page marker
+    assert all(chunk.startswith("\n--- Page ") for chunk in chunks)
+
+def test_merge_takes_document_fields_from_the_first_chunk_that_has_them():
+    merged = merge_regulations([
+        regulation([section("Scope", "short")], reference="BSD/1"),
+        regulation([section("scope.", "a longer description"), section("Returns", "monthly")], title="Circular", reference="BSD/2"),
+    ])
+
+    assert (merged.title, merged.reference) == ("Circular", "BSD/1")
+    # Sections repeated across chunks are kept once, with the most detailed description
+    assert [(s.title, s.description) for s in merged.sections] == [("scope.", "a longer description"), ("Returns", "monthly")]
@@ -0,0 +1,35 @@
+from app.services.search import InvertedIndex
+
+def ids(index, query):
+    return sorted(payload for _, payload in index.search(query))
+
+def test_writes_made_during_a_rebuild_survive_the_swap():
+    index = InvertedIndex()
+    index.rebuild([(1, "ada lovelace", 1), (2, "grace hopper", 2)])
+
+    # Rows for the rebuild are read, then an insert and a delete land before the swap
+    index.begin_rebuild()
+    snapshot = [(1, "ada lovelace", 1), (2, "grace hopper", 2)]
+    index.add(3, "ada byron", 3)
+    index.remove(2)
+    index.rebuild(snapshot)
+
+    assert ids(index, "ada") == [1, 3]
+    assert ids(index, "grace") == []
+    assert index.journal is None
+
+def test_invalidated_during_a_rebuild_stays_stale():
+    index = InvertedIndex()
+    index.begin_rebuild()
+    index.invalidate()
+    index.rebuild([(1, "ada lovelace", 1)])
+
+    assert index.is_stale(ttl=300)
+    assert ids(index, "ada") == [1]
+
+def test_prefixes_match_and_every_term_is_required():
+    index = InvertedIndex()
+    index.rebuild([(1, "ada lovelace", 1), (2, "ada byron", 2)])
+
+    assert ids(index, "lov") == [1]
+    assert ids(index, "ada by") == [2]
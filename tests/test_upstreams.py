@@ -0,0 +1,75 @@
+import pytest
+
+from app.services import upstreams
+from app.services.upstreams import CircuitBreaker, CircuitOpen, TokenBucket, Upstream
+
+class Clock:
+    """Stands in for the time module, so the reset timeout passes without sleeping."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(upstreams, "time", clock)
+    return clock
+
+def test_circuit_opens_at_the_threshold(clock):
+    breaker = CircuitBreaker(threshold=3, reset_timeout=60)
+    for _ in range(2):
+        breaker.failed()
+        assert breaker.allow()
+
+    breaker.failed()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert breaker.retry_after() == 60
+
+def test_half_open_circuit_lets_exactly_one_trial_through(clock):
+    breaker = CircuitBreaker(threshold=1, reset_timeout=60)
+    breaker.failed()
+
+    clock.now += 60
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    # A failed trial opens the circuit for another reset timeout
+    breaker.failed()
+    assert breaker.state == "open"
+    clock.now += 60
+    assert breaker.allow()
+    breaker.succeeded()
+    assert breaker.state == "closed"
+    assert breaker.allow() and breaker.allow()
+
+def test_upstream_short_circuits_once_open(clock):
+    upstream = Upstream("test", rate=10)
+    for _ in range(upstream.breaker.threshold):
+        upstream.record(status_code=503)
+
+    with pytest.raises(CircuitOpen) as raised:
+        upstream.before_call()
+    assert raised.value.retry_after == upstream.breaker.reset_timeout
+
+def test_throttled_bucket_halves_its_rate_and_pauses(clock):
+    bucket = TokenBucket(rate=4, burst=2)
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.0
+    # The third caller waits for a token to refill
+    assert bucket.reserve() == pytest.approx(0.25)
+
+    bucket.throttled(retry_after=5)
+    assert bucket.rate == 2
+    assert bucket.reserve() == pytest.approx(5)
+
+    clock.now += 5
+    bucket.succeeded()
+    assert bucket.rate == pytest.approx(2.1)